@@ -0,0 +1,159 @@
+import multiprocessing as mp
+import queue
+import time
+
+from frame_buffer import FramePool, SharedFrameRing, SharedSourceRing
+from sources import FrameSource, configure_capture, open_source
+
+
+def _reclaim(pool, free_slots, timeout=None):
+    """Release the slot indices the reader has handed back; with ``timeout``, wait for at least one."""
+    try:
+        pool.release(free_slots.get(timeout=timeout) if timeout else free_slots.get_nowait())
+        while True:
+            pool.release(free_slots.get_nowait())
+    except queue.Empty:
+        pass
+
+
+def camera_worker(spec, ring_name, imgsz, display_size, depth, capture_size, messages, free_slots, stop, realtime,
+                  seed, backend="any", settings=None, roi=None, keep_source=False, lossless=False):
+    """Capture and letterbox one camera in its own process.
+
+    Frames are written into the shared ring; only ``("frame", index, timestamp,
+    geometry, source_name)`` tuples travel over ``messages``. A slot is only
+    rewritten after the reader has put its index back on ``free_slots``; until
+    then new frames are dropped, or with ``lossless`` capture waits. With
+    ``keep_source`` the full-resolution frames go to a ``SharedSourceRing``
+    named by ``source_name`` (``None`` otherwise). The first message is
+    ``("open", ok)`` and the last one ``("eof",)``.
+    """
+    ring = SharedFrameRing(imgsz, display_size, depth, name=ring_name)
+    source = None
+    cap = open_source(spec, realtime=realtime, seed=seed, backend=backend)
+    opened = cap.isOpened()
+    if opened and not isinstance(cap, FrameSource):
+        configure_capture(cap, *(capture_size or (None, None)), **(settings or {}))
+    messages.put(("open", opened))
+    pool = None
+    dropped = 0
+    while opened and not stop.is_set():
+        ret, raw = cap.read(pool.raw) if pool is not None else cap.read()
+        if not ret:
+            if getattr(cap, "exhausted", False):
+                break
+            time.sleep(0.01)
+            continue
+        timestamp = time.monotonic()
+        if pool is None or raw.shape != pool.raw.shape:
+            if keep_source:
+                if source is not None:
+                    source.close()
+                source = SharedSourceRing(depth, raw.shape)
+            pool = FramePool((raw.shape[1], raw.shape[0]), imgsz, display_size,
+                             model_bufs=ring.model_bufs, display_bufs=ring.display_bufs, roi=roi,
+                             source_bufs=source.bufs if source is not None else None,
+                             free=pool.free_slots() if pool is not None else None)
+        _reclaim(pool, free_slots)
+        while lossless and not pool.free_slots() and not stop.is_set():
+            _reclaim(pool, free_slots, timeout=0.1)
+        if pool.fill(raw) is None:
+            dropped += 1
+            continue
+        message = ("frame", pool.last_index, timestamp, pool.geometry, source.name if source is not None else None,
+                   dropped)
+        # A bounded message queue (lossless runs) makes this wait for the reader.
+        while not stop.is_set():
+            try:
+                messages.put(message, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+    messages.put(("eof",))
+    cap.release()
+    pool = None
+    if source is not None:
+        source.close()
+    ring.close()
+
+
+class CameraProcess:
+    """Inference-side handle for a camera captured by ``camera_worker``.
+
+    Exposes the ``isOpened``/``release`` subset of ``cv2.VideoCapture`` so it can
+    sit in ``MultiCameraYOLO.cameras`` next to in-process sources.
+    """
+
+    def __init__(self, spec, imgsz=640, display_size=(640, 400), depth=12, capture_size=None,
+                 realtime=True, seed=0, lossless=False, backend="any", settings=None, roi=None, keep_source=False,
+                 open_timeout=30.0):
+        ctx = mp.get_context("spawn")
+        self.ring = SharedFrameRing(imgsz, display_size, depth)
+        self.source = None
+        self.messages = ctx.Queue(maxsize=1 if lossless else 0)
+        self.free_slots = ctx.Queue()
+        self.lossless = lossless
+        self.open_timeout = open_timeout
+        self.exhausted = False
+        self.skipped = 0
+        self.no_free_slot = 0
+        self._opened = None
+        self._stop = ctx.Event()
+        self.process = ctx.Process(
+            target=camera_worker,
+            args=(spec, self.ring.name, imgsz, display_size, depth, capture_size, self.messages, self.free_slots,
+                  self._stop, realtime, seed, backend, settings, roi, keep_source, lossless),
+            daemon=True,
+        )
+        self.process.start()
+
+    def isOpened(self):
+        if self._opened is None:
+            try:
+                _, self._opened = self.messages.get(timeout=self.open_timeout)
+            except queue.Empty:
+                self._opened = False
+        return self._opened
+
+    def read(self, timeout=0.1):
+        """Return ``(frame, timestamp)`` for the newest frame, or ``None``.
+
+        Unless lossless, older pending frames are skipped and their slots handed
+        straight back. The returned frame is a view of its ring slot until
+        ``CapturedFrame.detach`` (or ``release``) hands the slot back too.
+        """
+        try:
+            message = self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        while not self.lossless and message[0] == "frame":
+            try:
+                newer = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            self.skipped += 1
+            self.free_slots.put(message[1])
+            message = newer
+        if message[0] != "frame":
+            self.exhausted = True
+            return None
+        _, index, timestamp, geometry, source_name, self.no_free_slot = message
+        if source_name is not None and (self.source is None or self.source.name != source_name):
+            # The camera process made a new ring for a new frame size.
+            if self.source is not None:
+                self.source.close()
+            width, height = geometry[3]
+            self.source = SharedSourceRing(self.ring.depth, (height, width, 3), name=source_name)
+        source_bufs = self.source.bufs if source_name is not None else None
+        frame = self.ring.frame(index, geometry, source_bufs)
+        frame._release = lambda: self.free_slots.put(index)
+        return frame, timestamp
+
+    def release(self):
+        self._stop.set()
+        self.process.join(timeout=5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.source is not None:
+            self.source.close()
+        self.ring.close()
@@ -0,0 +1,141 @@
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from postprocess import class_names, to_detections
+from tracker import Detections, box_iou
+
+
+class CascadeModel:
+    """Generic bottle/can detector followed by a brand classifier on the crops.
+
+    The detector only has to find containers, so it can be a much smaller model;
+    detections of any other class it knows are ignored. Each container is
+    reported twice, once with its generic class and once with the brand the
+    classifier picked, matching what the single 11-class model returns.
+
+    Brands are cached per ``key`` (camera): a detection overlapping a cached
+    box of the same generic class by ``reuse_iou`` keeps its brand, so the
+    classifier only runs on containers that appeared or moved. ``max_keys``
+    (least recently used keys go first) and ``ttl_s`` bound the cache when
+    keys come and go, as with the API's terminals.
+    """
+
+    def __init__(self, detector, classifier, generic_classes=("bottle", "can"), min_brand_conf=0.0,
+                 reuse_iou=0.6, crop_margin=0.05, profiler=None, max_keys=None, ttl_s=None):
+        self.detector = detector
+        self.classifier = classifier
+        detector_names = class_names(detector.names)
+        generic = [name for name in detector_names if name in generic_classes]
+        if not generic:
+            raise ValueError(f"detector has none of the generic classes {generic_classes}")
+        brands = [name for name in class_names(classifier.names) if name not in generic]
+        self.names = generic + brands
+        self.num_generic = len(generic)
+        # Detector class id -> cascade class id, -1 for classes the cascade ignores.
+        self._generic_ids = np.array([generic.index(n) if n in generic else -1 for n in detector_names])
+        self._brand_ids = np.array([
+            self.names.index(n) if n in brands else -1 for n in class_names(classifier.names)
+        ])
+        self.min_brand_conf = min_brand_conf
+        self.reuse_iou = reuse_iou
+        self.crop_margin = crop_margin
+        self.profiler = profiler
+        self.max_keys = max_keys
+        self.ttl_s = ttl_s
+        self._cache = OrderedDict()
+        self.classified = 0
+        self.reused = 0
+
+    def predict(self, model_input, images, rgb=False, keys=None, device=None, **kwargs):
+        """``Detections`` per image, with class ids indexing ``names``.
+
+        ``model_input`` goes to the detector as is (list of images or batch
+        tensor); ``images`` are the same pictures as arrays, for cropping, in
+        the detector's coordinates. ``rgb`` says their channel order.
+        """
+        results = self.detector(model_input, device=device, verbose=False, **kwargs)
+        return self.label([to_detections(result) for result in results], images, rgb, keys, device)
+
+    def label(self, detector_output, images, rgb=False, keys=None, device=None):
+        """``Detections`` per image from the detector's own ``(boxes, confidences, class_ids)``.
+
+        For detectors that aren't called through Ultralytics. A ``None`` key
+        skips the brand cache for that image.
+        """
+        detections = []
+        for boxes, confidences, class_ids in detector_output:
+            generic_ids = self._generic_ids[class_ids.astype(np.intp)]
+            keep = generic_ids >= 0
+            detections.append((boxes[keep], confidences[keep], generic_ids[keep]))
+
+        brands = [np.full(len(d[0]), -1, dtype=np.intp) for d in detections]
+        brand_confs = [np.zeros(len(d[0]), dtype=np.float32) for d in detections]
+        pending, crops = [], []
+        for i, (boxes, _, generic_ids) in enumerate(detections):
+            cached = self._cached(keys[i]) if keys is not None else None
+            if cached is not None and len(cached[0]) and len(boxes):
+                iou = box_iou(boxes, cached[0])
+                iou[generic_ids[:, None] != cached[1][None, :]] = 0
+                best = iou.argmax(axis=1)
+                hit = iou[np.arange(len(boxes)), best] >= self.reuse_iou
+                brands[i][hit] = cached[2][best[hit]]
+                brand_confs[i][hit] = cached[3][best[hit]]
+                self.reused += int(hit.sum())
+            for j in np.flatnonzero(brands[i] < 0):
+                pending.append((i, j))
+                crops.append(self._crop(images[i], boxes[j], rgb))
+
+        if crops:
+            with self.profiler.section("classify") if self.profiler is not None else nullcontext():
+                outputs = self.classifier(crops, device=device, verbose=False)
+            for (i, j), output in zip(pending, outputs):
+                brands[i][j] = self._brand_ids[int(output.probs.top1)]
+                brand_confs[i][j] = float(output.probs.top1conf)
+            self.classified += len(crops)
+
+        merged = []
+        for i, (boxes, confidences, generic_ids) in enumerate(detections):
+            if keys is not None and keys[i] is not None:
+                self._store(keys[i], (boxes, generic_ids, brands[i], brand_confs[i], time.monotonic()))
+            branded = (brands[i] >= 0) & (brand_confs[i] >= self.min_brand_conf)
+            # Brand boxes carry the detector's confidence so tracking treats both copies alike.
+            merged.append(Detections(
+                np.concatenate([boxes, boxes[branded]]),
+                np.concatenate([confidences, confidences[branded]]),
+                np.concatenate([generic_ids, brands[i][branded]]),
+            ))
+        return merged
+
+    def _cached(self, key):
+        cached = self._cache.get(key) if key is not None else None
+        if cached is not None and self.ttl_s is not None and time.monotonic() - cached[4] > self.ttl_s:
+            del self._cache[key]
+            return None
+        return cached
+
+    def _store(self, key, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while self.max_keys is not None and len(self._cache) > self.max_keys:
+            self._cache.popitem(last=False)
+
+    def _crop(self, image, box, rgb):
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = box
+        margin_x, margin_y = (x2 - x1) * self.crop_margin, (y2 - y1) * self.crop_margin
+        x1, y1 = max(0, int(x1 - margin_x)), max(0, int(y1 - margin_y))
+        x2, y2 = min(width, int(np.ceil(x2 + margin_x))), min(height, int(np.ceil(y2 + margin_y)))
+        crop = image[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+        # Ultralytics expects BGR arrays.
+        return cv2.cvtColor(crop, cv2.COLOR_RGB2BGR) if rgb else crop
+
+    def warm_up(self, device=None, batch_size=1, size=96):
+        crop = np.full((size, size, 3), 114, dtype=np.uint8)
+        self.classifier([crop] * batch_size, device=device, verbose=False)
+
+    def stats(self):
+        return {"classified": self.classified, "reused": self.reused}
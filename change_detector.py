@@ -0,0 +1,46 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class ChangeDetector:
+    """Cheap per-camera test for whether the scene changed since the last inference.
+
+    Frames are shrunk to a small grayscale thumbnail and compared against the
+    thumbnail of the last frame that was sent to the model. The scene counts as
+    changed when more than ``threshold`` (a fraction) of the thumbnail pixels
+    differ by more than ``pixel_threshold`` grey levels, or when
+    ``refresh_interval`` seconds have passed since the last accepted frame, so
+    a missed change can never freeze the counts for long.
+    """
+
+    def __init__(self, threshold=0.01, pixel_threshold=25, size=(64, 36), refresh_interval=2.0):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self._reference = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._has_reference = False
+        self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self._thumb = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._diff = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._last_accept = 0.0
+        self.changed_count = 0
+        self.skipped_count = 0
+
+    def changed(self, image, now=None):
+        now = time.monotonic() if now is None else now
+        cv2.resize(image, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._thumb)
+        if self._has_reference and now - self._last_accept < self.refresh_interval:
+            cv2.absdiff(self._thumb, self._reference, dst=self._diff)
+            changed_pixels = np.count_nonzero(self._diff > self.pixel_threshold)
+            if changed_pixels <= self.threshold * self._diff.size:
+                self.skipped_count += 1
+                return False
+        self._reference[:] = self._thumb
+        self._has_reference = True
+        self._last_accept = now
+        self.changed_count += 1
+        return True
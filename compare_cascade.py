@@ -0,0 +1,115 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import yaml
+
+from cascade import CascadeModel
+from pipeline import percentiles_ms
+from postprocess import class_names, count_classes, to_detections
+
+
+def image_paths(data, split):
+    root = data.get("path", "")
+    entries = data[split] if isinstance(data[split], list) else [data[split]]
+    paths = []
+    for entry in entries:
+        entry = os.path.join(root, entry)
+        if os.path.isdir(entry):
+            paths += sorted(p for p in glob.glob(os.path.join(entry, "*")) if p.lower().endswith((".jpg", ".jpeg", ".png")))
+        else:
+            with open(entry, encoding="utf-8") as f:
+                paths += [os.path.join(root, line.strip()) for line in f if line.strip()]
+    return paths
+
+
+def label_counts(image_path, num_classes):
+    # YOLO layout: .../images/x.jpg -> .../labels/x.txt
+    label_path = os.path.splitext(image_path.replace(f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"))[0] + ".txt"
+    if not os.path.exists(label_path):
+        return np.zeros(num_classes, dtype=np.intp)
+    with open(label_path, encoding="utf-8") as f:
+        class_ids = [int(line.split()[0]) for line in f if line.strip()]
+    return count_classes(class_ids, num_classes)
+
+
+def remap(counts, names, target_names):
+    """Re-index a count array from ``names`` order to ``target_names`` order."""
+    out = np.zeros(len(target_names), dtype=np.intp)
+    for name, count in zip(names, counts):
+        if name in target_names:
+            out[target_names.index(name)] += count
+    return out
+
+
+def summarise(predicted, truth, latencies, names):
+    errors = np.abs(np.array(predicted) - np.array(truth))
+    return {
+        "images": len(truth),
+        "exact_match": round(float(np.mean(errors.sum(axis=1) == 0)), 4),
+        "count_mae": round(float(errors.sum(axis=1).mean()), 4),
+        "class_mae": {name: round(float(v), 4) for name, v in zip(names, errors.mean(axis=0))},
+        "latency": percentiles_ms(latencies),
+        "images_per_s": round(len(latencies) / sum(latencies), 2) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the single detector with the detector + classifier cascade")
+    parser.add_argument("--data", default="datasets/data.yaml", help="YOLO dataset yaml with the 11-class labels")
+    parser.add_argument("--split", default="test", help="Dataset split to evaluate (default test)")
+    parser.add_argument("--model", required=True, help="Single-model detector with generic and brand classes")
+    parser.add_argument("--detector", required=True, help="Cascade bottle/can detector")
+    parser.add_argument("--classifier", required=True, help="Cascade brand classifier")
+    parser.add_argument("--conf", type=float, default=0.8, help="Detection confidence threshold (default 0.8)")
+    parser.add_argument("--iou", type=float, default=0.8, help="NMS IoU threshold (default 0.8)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Detector input size (default 640)")
+    parser.add_argument("--device", default=None, help="Inference device, e.g. cpu or 0")
+    parser.add_argument("--output", default=None, help="Also write the comparison to this JSON file")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    with open(args.data, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    names = class_names(data["names"])
+    single = YOLO(args.model)
+    single_names = class_names(single.names)
+    cascade = CascadeModel(YOLO(args.detector), YOLO(args.classifier, task="classify"))
+    options = dict(conf=args.conf, iou=args.iou, imgsz=args.imgsz)
+
+    truth, single_counts, cascade_counts = [], [], []
+    single_latencies, cascade_latencies = [], []
+    for path in image_paths(data, args.split):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        truth.append(label_counts(path, len(names)))
+
+        started = time.perf_counter()
+        detections = to_detections(single(image, device=args.device, verbose=False, **options)[0])
+        single_latencies.append(time.perf_counter() - started)
+        single_counts.append(remap(count_classes(detections.class_ids, len(single_names)), single_names, names))
+
+        started = time.perf_counter()
+        detections = cascade.predict(image, [image], device=args.device, **options)[0]
+        cascade_latencies.append(time.perf_counter() - started)
+        cascade_counts.append(remap(count_classes(detections.class_ids, len(cascade.names)), cascade.names, names))
+
+    if not truth:
+        raise SystemExit(f"No images found for split {args.split!r} in {args.data}")
+    report = {
+        "single": summarise(single_counts, truth, single_latencies, names),
+        "cascade": summarise(cascade_counts, truth, cascade_latencies, names),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import math
+import threading
+
+import numpy as np
+
+
+class GridCompositor:
+    """Display canvas allocated once, with one tile per camera plus a results-table tile.
+
+    Tiles are views into the canvas, so callers draw straight into them. The
+    grid is as square as possible: 3 cameras + table give the familiar 2x2,
+    8 cameras + table a 3x3. ``lock`` guards the canvas between the render
+    thread writing it and the display thread showing it.
+    """
+
+    def __init__(self, num_cameras, tile_size=(640, 400), columns=None):
+        tiles = num_cameras + 1
+        self.columns = columns or math.ceil(math.sqrt(tiles))
+        self.rows = math.ceil(tiles / self.columns)
+        width, height = tile_size
+        self.canvas = np.zeros((self.rows * height, self.columns * width, 3), dtype=np.uint8)
+        self.tiles = [
+            self.canvas[r * height:(r + 1) * height, c * width:(c + 1) * width]
+            for r in range(self.rows) for c in range(self.columns)
+        ][:tiles]
+        self.num_cameras = num_cameras
+        self.lock = threading.Lock()
+        self._table_key = None
+
+    def camera_tile(self, index):
+        return self.tiles[index]
+
+    @property
+    def table_tile(self):
+        return self.tiles[self.num_cameras]
+
+    def update_table(self, key, draw):
+        """Redraw the table tile with ``draw(tile)`` only when ``key`` changed."""
+        if key == self._table_key:
+            return False
+        self.table_tile[:] = 0
+        draw(self.table_tile)
+        self._table_key = key
+        return True
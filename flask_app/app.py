@@ -1,30 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
-import yaml
+import cv2
+import os
+import threading
+import time
+from scr.batcher import MicroBatcher
+from scr.config import load_config
 from scr.drink_model import DrinkModel
-from scr.utils import match_and_combine_results, count_total_products, check_totals, decode_base64_image
+from scr.result_cache import ResultCache
+from scr.utils import (match_and_combine_results, count_total_products, check_totals, decode_base64_image,
+                       decode_image_bytes, ImageTooLargeError)
 
 app = Flask(__name__)
+CAMERA_IDS = ['camera1', 'camera2', 'camera3']
 
-with open("config/drink_model.yaml", "r") as f:
-    drink_cfg = yaml.safe_load(f)
+drink_cfg = load_config()
+# gunicorn.conf.py splits the cores between workers so their thread pools don't oversubscribe them.
+if os.environ.get("INTRA_OP_THREADS"):
+    drink_cfg.setdefault("intra_op_threads", int(os.environ["INTRA_OP_THREADS"]))
+if drink_cfg.get("intra_op_threads"):
+    cv2.setNumThreads(drink_cfg["intra_op_threads"])
+startup_started = time.perf_counter()
 drink_model = DrinkModel(drink_cfg)
+# Images from concurrent requests share forward passes.
+batching_cfg = drink_cfg.get("batching", {})
+batcher = MicroBatcher(drink_model.infer_counts_batch,
+                       max_batch_size=batching_cfg.get("max_batch_size", 12),
+                       max_wait_ms=batching_cfg.get("max_wait_ms", 10))
+# Images are decoded at reduced resolution when the model would downscale them anyway,
+# and oversized uploads are rejected before any pixels are decoded.
+decode_cfg = drink_cfg.get("decode", {})
+decode_options = {
+    "target_size": decode_cfg.get("target_size", 640),
+    "max_bytes": decode_cfg.get("max_payload_bytes", 10 * 1024 * 1024),
+    "max_pixels": decode_cfg.get("max_pixels", 40_000_000),
+}
+# Whole requests (three base64 images plus JSON overhead) are capped by Flask itself.
+app.config["MAX_CONTENT_LENGTH"] = len(CAMERA_IDS) * decode_options["max_bytes"] * 4 // 3 + 64 * 1024
+# Decoding releases the GIL, so the cameras of a request decode in parallel. The pool is
+# shared by all requests, which bounds decode threads no matter how many requests arrive.
+# By default it gets this worker's share of the cores, like the model's thread pool.
+decode_workers = decode_cfg.get("workers") or drink_cfg.get("intra_op_threads") or min(8, os.cpu_count() or 1)
+decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+# Terminals often resend identical frames; their counts are served from a cache keyed by
+# the encoded image bytes, skipping decode and inference.
+cache_cfg = drink_cfg.get("cache", {})
+result_cache = ResultCache(f"{drink_model.version()}|target_size={decode_options['target_size']}",
+                           max_entries=cache_cfg.get("max_entries", 4096),
+                           ttl_s=cache_cfg.get("ttl_s", 60),
+                           max_bytes=cache_cfg.get("max_bytes", 8 * 1024 * 1024))
+# Warm up with the batch sizes traffic produces, so the first requests don't pay for setup.
+drink_model.warm_up(decode_options["target_size"], {1, len(CAMERA_IDS), batcher.max_batch_size})
+startup_seconds = round(time.perf_counter() - startup_started, 3)
+ready = threading.Event()
+ready.set()
 
 
 @app.route('/process_drink', methods=['POST'])
 def process_drink():
     data = request.json
-    cam_results = []
 
-    for cam_id in ['camera1', 'camera2', 'camera3']:
+    for cam_id in CAMERA_IDS:
         if cam_id not in data:
             return jsonify({"error": f"Thiếu ảnh từ {cam_id}"}), 400
+
+    return count_drinks(decode_base64_image, [data[cam_id] for cam_id in CAMERA_IDS])
+
+
+@app.route('/process_drink_binary', methods=['POST'])
+def process_drink_binary():
+    """Same as /process_drink, but with the encoded images sent as bytes.
+
+    Either multipart/form-data with one file field per camera, or a raw body with
+    the three JPEG/PNG files back to back and their byte sizes in the
+    X-Image-Sizes header (e.g. "52311,49876,50102").
+    """
+    if request.files:
+        payloads = []
+        for cam_id in CAMERA_IDS:
+            if cam_id not in request.files:
+                return jsonify({"error": f"Thiếu ảnh từ {cam_id}"}), 400
+            payloads.append(request.files[cam_id].read())
+    else:
+        body = request.get_data(cache=False)
+        try:
+            sizes = [int(size) for size in request.headers.get("X-Image-Sizes", "").split(",")]
+        except ValueError:
+            sizes = []
+        if len(sizes) != len(CAMERA_IDS) or sum(sizes) != len(body) or min(sizes) <= 0:
+            return jsonify({"error": "X-Image-Sizes phải chứa kích thước của 3 ảnh, tổng bằng độ dài body"}), 400
+        view = memoryview(body)
+        offsets = [sum(sizes[:i]) for i in range(len(sizes))]
+        payloads = [view[offset:offset + size] for offset, size in zip(offsets, sizes)]
+
+    return count_drinks(decode_image_bytes, payloads)
+
+
+def decode_cameras(decode, payloads, cam_ids):
+    """Decode every camera's payload on the shared pool.
+
+    Returns ``(images, None)``, or ``(None, response)`` naming the first camera
+    that failed, as the sequential version did.
+    """
+    futures = [decode_pool.submit(decode, payload, **decode_options) for payload in payloads]
+    images = []
+    for cam_id, future in zip(cam_ids, futures):
+        try:
+            images.append(future.result())
+        except Exception as e:
+            for pending in futures:
+                pending.cancel()
+            status = 413 if isinstance(e, ImageTooLargeError) else 400
+            return None, (jsonify({"error": f"Lỗi với {cam_id}: {str(e)}"}), status)
+    return images, None
+
+
+def brand_cache_keys(cam_ids):
+    """Keys for the cascade's brand cache, one per camera of the terminal named in the X-Terminal-Id header.
+
+    Client addresses are shared behind proxies and NAT, so without the header
+    brands are not reused across requests.
+    """
+    terminal_id = request.headers.get("X-Terminal-Id")
+    return [f"{terminal_id}/{cam_id}" if terminal_id else None for cam_id in cam_ids]
+
+
+def count_drinks(decode, payloads):
+    """Counts for the cameras' encoded ``payloads``; only cache misses are decoded and inferred."""
+    keys = [result_cache.key(payload) for payload in payloads]
+    cam_results = [result_cache.get(key) for key in keys]
+    missing = [i for i, counts in enumerate(cam_results) if counts is None]
+    if missing:
+        images, error = decode_cameras(decode, [payloads[i] for i in missing], [CAMERA_IDS[i] for i in missing])
+        if error:
+            return error
         try:
-            image = decode_base64_image(data[cam_id])
-            cam_results.append(drink_model.infer(image))
+            counts = batcher.infer(images, brand_cache_keys([CAMERA_IDS[i] for i in missing]))
         except Exception as e:
-            return jsonify({"error": f"Lỗi với {cam_id}: {str(e)}"}), 400
+            return jsonify({"error": f"Lỗi suy luận: {str(e)}"}), 500
+        for i, cam_counts in zip(missing, counts):
+            cam_results[i] = cam_counts
+            result_cache.put(keys[i], cam_counts)
 
-    combined = match_and_combine_results(cam_results)
+    combined = match_and_combine_results(cam_results, drink_model.names)
     bottle, can = count_total_products(combined)
     check_totals(combined, bottle, can)
 
@@ -33,5 +151,28 @@ def process_drink():
         "combined_results": {k: v for k, v in combined.items() if k not in ['bottle', 'can']}
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Per worker process; the pid tells workers apart.
+    return jsonify({"pid": os.getpid(), "startup_s": startup_seconds,
+                    "batching": batcher.stats(), "cache": result_cache.stats()})
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Not ready while shutting down, or if the batching thread has died.
+    if not ready.is_set() or not batcher.is_alive():
+        return jsonify({"status": "not ready"}), 503
+    return jsonify({"status": "ready"})
+
+def shutdown():
+    """Stop taking work and let in-flight batches and decodes finish (gunicorn's worker_exit hook)."""
+    ready.clear()
+    batcher.close()
+    decode_pool.shutdown(wait=True, cancel_futures=True)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,32 @@
+# Production serving: gunicorn -c gunicorn.conf.py app:app
+import os
+import sys
+
+from scr.config import load_config
+
+serving = load_config().get("serving", {})
+
+cpu_count = os.cpu_count() or 1
+bind = os.environ.get("BIND", serving.get("bind", "0.0.0.0:5000"))
+workers = int(os.environ.get("WEB_CONCURRENCY", serving.get("workers", 2)))
+worker_class = "gthread"
+threads = serving.get("threads", 4)
+timeout = serving.get("timeout", 60)
+graceful_timeout = serving.get("graceful_timeout", 30)
+# Every worker imports app.py itself, loading and warming its own model before it
+# accepts connections. Preloading in the master would fork the batching and decode
+# threads away, and model runtimes are not fork-safe.
+preload_app = False
+
+# Split the cores between workers. These are read when torch / onnxruntime / OpenCV
+# start their thread pools, so they are set before any worker imports the app.
+intra_op_threads = max(1, cpu_count // workers)
+os.environ.setdefault("INTRA_OP_THREADS", str(intra_op_threads))
+for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(var, os.environ["INTRA_OP_THREADS"])
+
+
+def worker_exit(server, worker):
+    app_module = sys.modules.get("app")
+    if app_module is not None:
+        app_module.shutdown()
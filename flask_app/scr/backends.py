@@ -0,0 +1,191 @@
+import os
+
+import cv2
+import numpy as np
+from postprocess import class_names, to_detections
+from tracker import Detections
+
+# Same limits as Ultralytics' non_max_suppression.
+MAX_DET = 300
+MAX_NMS = 30000
+MAX_WH = 7680
+
+
+class UltralyticsBackend:
+    """A ``.pt`` (or any Ultralytics-loadable) model run through ``ultralytics.YOLO``.
+
+    Images are letterboxed here to the square ``imgsz`` input the ONNX export
+    takes, rather than to Ultralytics' own stride-32 rectangle, so both
+    backends feed the network the same pixels and count alike.
+    """
+
+    def __init__(self, config):
+        from ultralytics import YOLO
+        if config.get("intra_op_threads"):
+            import torch
+            torch.set_num_threads(config["intra_op_threads"])
+        self.model = YOLO(os.path.abspath(config["model_path"]))
+        self.names = class_names(self.model.names)
+        self.input_size = (config.get("imgsz", 640),) * 2
+        self.conf_threshold = config["conf_threshold"]
+        self.iou_threshold = config["iou_threshold"]
+
+    def detect(self, images):
+        """``(boxes, confidences, class_ids)`` per RGB array, boxes as xyxy in image pixels."""
+        import torch
+        inputs, transforms = zip(*(letterbox(image, self.input_size) for image in images))
+        # A BCHW tensor skips Ultralytics' preprocessing; boxes come back in input pixels.
+        results = self.model(torch.from_numpy(np.stack(inputs)), conf=self.conf_threshold,
+                             iou=self.iou_threshold, verbose=False)
+        detections = []
+        for result, transform, image in zip(results, transforms, images):
+            boxes, confidences, class_ids = to_detections(result)
+            detections.append(Detections(scale_boxes(boxes, transform, image.shape), confidences, class_ids))
+        return detections
+
+
+class OnnxRuntimeBackend:
+    """The DeepStream ONNX export (``boxes``/``scores``/``classes``) run with ONNX Runtime on CPU.
+
+    Letterboxing, NMS and box rescaling are done in NumPy with Ultralytics' rules,
+    so neither PyTorch nor Ultralytics is imported. The letterbox is the same
+    square one ``UltralyticsBackend`` uses, so the two backends count alike.
+
+    The graph carries no class names; see ``onnx_class_names``.
+    """
+
+    def __init__(self, config):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if config.get("intra_op_threads"):
+            options.intra_op_num_threads = config["intra_op_threads"]
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(os.path.abspath(config["model_path"]), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        batch, _, height, width = self.session.get_inputs()[0].shape
+        # Static exports (the default) take exactly `batch` images per run.
+        self.batch_size = batch if isinstance(batch, int) else None
+        self.input_size = (height, width)
+        if config.get("imgsz") and self.input_size != (config["imgsz"],) * 2:
+            raise ValueError(f"imgsz {config['imgsz']} in the config, but the ONNX model takes {height}x{width}")
+        self.names = onnx_class_names(config)
+        self.conf_threshold = config["conf_threshold"]
+        self.iou_threshold = config["iou_threshold"]
+
+    def detect(self, images):
+        """``(boxes, confidences, class_ids)`` per RGB array, boxes as xyxy in image pixels."""
+        inputs, transforms = zip(*(letterbox(image, self.input_size) for image in images))
+        batch = np.stack(inputs)
+        step = self.batch_size or len(batch)
+        outputs = []
+        for start in range(0, len(batch), step):
+            chunk = batch[start:start + step]
+            padding = step - len(chunk)
+            if padding:
+                chunk = np.concatenate([chunk, np.zeros((padding,) + chunk.shape[1:], chunk.dtype)])
+            boxes, scores, classes = self.session.run(["boxes", "scores", "classes"], {self.input_name: chunk})
+            outputs += list(zip(boxes, scores, classes))[:step - padding]
+        return [self._postprocess(*output, transform, image.shape)
+                for output, transform, image in zip(outputs, transforms, images)]
+
+    def _postprocess(self, boxes, scores, classes, transform, shape):
+        scores, classes = scores[:, 0], classes[:, 0]
+        keep = scores > self.conf_threshold
+        boxes, scores, classes = xywh2xyxy(boxes[keep]), scores[keep], classes[keep]
+        if len(classes) and classes.max() >= len(self.names):
+            raise ValueError(f"Model returned class id {int(classes.max())} but only {len(self.names)} "
+                             f"class names are known; check labels_path / classes in the config")
+        if len(scores) > MAX_NMS:
+            top = np.argsort(-scores, kind="stable")[:MAX_NMS]
+            boxes, scores, classes = boxes[top], scores[top], classes[top]
+        # Offsetting boxes by class keeps NMS from suppressing across classes.
+        keep = nms(boxes + classes[:, None] * MAX_WH, scores, self.iou_threshold)[:MAX_DET]
+        boxes = scale_boxes(boxes[keep], transform, shape)
+        return Detections(boxes, scores[keep], classes[keep])
+
+
+BACKENDS = {
+    "pytorch": UltralyticsBackend,
+    "onnxruntime": OnnxRuntimeBackend,
+}
+
+
+def load_backend(config):
+    name = config.get("backend", "pytorch")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](config)
+
+
+def onnx_class_names(config):
+    """Class names of an ONNX export, in class id order.
+
+    Read from ``labels_path``, by default the exporter's labels.txt next to
+    ``model_path``, else from ``classes`` in the config. If both exist they
+    must match, so a stale list fails at load time rather than mislabelling.
+    """
+    labels_path = config.get("labels_path") or os.path.join(
+        os.path.dirname(os.path.abspath(config["model_path"])), "labels.txt")
+    classes = list(config["classes"]) if config.get("classes") else None
+    if not os.path.exists(labels_path):
+        if config.get("labels_path"):
+            raise FileNotFoundError(f"labels_path {labels_path} not found")
+        if classes is None:
+            raise ValueError(f"No class names for {config['model_path']}: no {labels_path} and no classes in the config")
+        return classes
+    with open(labels_path) as f:
+        names = [line.strip() for line in f if line.strip()]
+    if classes is not None and classes != names:
+        raise ValueError(f"classes in the config ({len(classes)}) don't match {labels_path} ({len(names)})")
+    return names
+
+
+def letterbox(image, size, pad_value=114):
+    """Resize keeping the aspect ratio and pad symmetrically to ``size`` (h, w), as Ultralytics does.
+
+    Returns the normalised CHW float32 input and ``(gain, pad_w, pad_h)`` to map boxes back.
+    """
+    height, width = image.shape[:2]
+    gain = min(size[0] / height, size[1] / width)
+    new_w, new_h = int(round(width * gain)), int(round(height * gain))
+    pad_w, pad_h = (size[1] - new_w) / 2, (size[0] - new_h) / 2
+    if (new_w, new_h) != (width, height):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(pad_value,) * 3)
+    return image.transpose(2, 0, 1).astype(np.float32) / 255.0, (gain, pad_w, pad_h)
+
+
+def xywh2xyxy(boxes):
+    xy, half = boxes[:, :2], boxes[:, 2:4] / 2
+    return np.concatenate([xy - half, xy + half], axis=1)
+
+
+def scale_boxes(boxes, transform, shape):
+    gain, pad_w, pad_h = transform
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] -= round(pad_w - 0.1)
+    boxes[:, [1, 3]] -= round(pad_h - 0.1)
+    boxes /= gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return boxes
+
+
+def nms(boxes, scores, iou_threshold):
+    """Indices of the boxes kept by greedy NMS, highest score first (as ``torchvision.ops.nms``)."""
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
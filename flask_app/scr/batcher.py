@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from pipeline import percentiles_ms
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Runs the images of concurrent requests through the model together.
+
+    A worker thread takes the first waiting request, then keeps collecting
+    requests until the batch holds ``max_batch_size`` images or the first one
+    has waited ``max_wait_ms``, and makes one ``infer_batch(images, keys)`` call
+    for all of them. A request's images always stay in the same batch; each
+    request gets its own slice of the results back through a ``Future``.
+    """
+
+    def __init__(self, infer_batch, max_batch_size=12, max_wait_ms=10.0, history=10000):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._carry = None
+        self._lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=history)
+        self._waits = deque(maxlen=history)
+        self._latencies = deque(maxlen=history)
+        self.batches = 0
+        self.requests = 0
+        self.images = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, images, keys=None):
+        """Queue ``images`` of one request; the ``Future`` resolves to their results, in order.
+
+        ``keys`` (one per image, e.g. the camera it comes from) are passed on to ``infer_batch``.
+        """
+        images = list(images)
+        keys = list(keys) if keys is not None else [None] * len(images)
+        future = Future()
+        self._queue.put((images, future, time.perf_counter(), keys))
+        return future
+
+    def infer(self, images, keys=None, timeout=None):
+        return self.submit(images, keys).result(timeout)
+
+    def _loop(self):
+        while True:
+            first, self._carry = self._carry or self._queue.get(), None
+            if first is _STOP:
+                return
+            batch, size = [first], len(first[0])
+            deadline = first[2] + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is _STOP or size + len(item[0]) > self.max_batch_size:
+                    # Handled first in the next round, so a stop ends the loop after this batch.
+                    self._carry = item
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._run(batch)
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        images = [image for item in batch for image in item[0]]
+        keys = [key for item in batch for key in item[3]]
+        try:
+            results = self.infer_batch(images, keys)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            for _, future, _, _ in batch:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        offset = 0
+        for request_images, future, _, _ in batch:
+            future.set_result(results[offset:offset + len(request_images)])
+            offset += len(request_images)
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.images += len(images)
+            self._batch_sizes.append(len(images))
+            self._waits.extend(started - submitted for _, _, submitted, _ in batch)
+            self._latencies.append(finished - started)
+
+    def stats(self):
+        with self._lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._waits)
+            latencies = list(self._latencies)
+            stats = {
+                "batches": self.batches,
+                "requests": self.requests,
+                "images": self.images,
+                "errors": self.errors,
+                "queue_depth": self._queue.qsize(),
+            }
+        stats["batch_size"] = {
+            "mean": round(float(np.mean(sizes)), 2) if sizes else 0.0,
+            "max": max(sizes, default=0),
+            "histogram": {str(size): int(count) for size, count in zip(*np.unique(sizes, return_counts=True))},
+        }
+        stats["queue_wait"] = percentiles_ms(waits)
+        stats["inference"] = percentiles_ms(latencies)
+        return stats
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def close(self, timeout=5.0):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
@@ -0,0 +1,12 @@
+import os
+
+import yaml
+
+# The one config file read by both app.py and gunicorn.conf.py. The DRINK_CONFIG
+# environment variable points the service at another one.
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "drink_config.yaml")
+
+
+def load_config(path=None):
+    with open(path or os.environ.get("DRINK_CONFIG", CONFIG_PATH), "r") as f:
+        return yaml.safe_load(f) or {}
@@ -1,18 +1,82 @@
-from ultralytics import YOLO
 import numpy as np
 import os
+from cascade import CascadeModel
+from postprocess import count_classes, counts_to_dict
+from scr.backends import load_backend
+from scr.utils import to_rgb
 
 class DrinkModel:
     def __init__(self, config):
-        self.model = YOLO(os.path.abspath(config["model_path"]))
-        self.names = self.model.names
+        self.config = config
+        # `backend` in the config picks how model_path is run: "pytorch" (Ultralytics) or
+        # "onnxruntime" (the DeepStream ONNX export, without PyTorch).
+        self.backend = load_backend(config)
+        self.names = list(self.backend.names)
         self.conf_threshold = config["conf_threshold"]
         self.iou_threshold = config["iou_threshold"]
+        # Optional cascade: model_path is then a bottle/can detector, and each container
+        # crop is labelled by a brand classifier.
+        self.cascade = None
+        if config.get("classifier_path"):
+            self._init_cascade(config)
+
+    def _init_cascade(self, config):
+        from ultralytics import YOLO
+        classifier = YOLO(os.path.abspath(config["classifier_path"]), task="classify")
+        self.cascade = CascadeModel(self.backend, classifier,
+                                    generic_classes=tuple(config.get("generic_classes", ["bottle", "can"])),
+                                    min_brand_conf=config.get("brand_conf_threshold", 0.0),
+                                    reuse_iou=config.get("brand_reuse_iou", 0.6),
+                                    max_keys=config.get("brand_cache_max_keys", 1024),
+                                    ttl_s=config.get("brand_cache_ttl_s", 60))
+        self.names = self.cascade.names
+
+    def infer_counts_batch(self, images, keys=None):
+        """Per-class count arrays for ``images``, from one batched forward pass.
+
+        ``keys`` name the camera each image comes from (``None``: unknown); with the
+        cascade, brands of containers that haven't moved since that camera's last image
+        are reused.
+        """
+        # Converted once: the detector and the cascade's crops both use the RGB arrays.
+        images = [to_rgb(image) for image in images]
+        detections = self.backend.detect(images)
+        if self.cascade is None:
+            return [count_classes(class_ids, len(self.names), confidences, self.conf_threshold)
+                    for _, confidences, class_ids in detections]
+        detections = self.cascade.label(detections, images, rgb=True, keys=keys)
+        return [count_classes(class_ids, len(self.names)) for _, _, class_ids in detections]
+
+    def infer_counts(self, image):
+        """Per-class counts for ``image`` as an array indexed by class id."""
+        return self.infer_counts_batch([image])[0]
+
+    def warm_up(self, image_size=640, batch_sizes=(1,)):
+        """Run blank batches so one-off setup (allocations, graph optimisation) happens before real traffic."""
+        image = np.full((image_size, image_size, 3), 114, dtype=np.uint8)
+        for batch_size in sorted(set(batch_sizes), reverse=True):
+            self.infer_counts_batch([image] * batch_size)
+        if self.cascade is not None:
+            # Blank images have no containers, so the classifier is warmed on its own.
+            self.cascade.warm_up()
+
+    def version(self):
+        """String that changes whenever the weights or the thresholds that shape results change."""
+        parts = []
+        for key in ("model_path", "classifier_path"):
+            path = self.config.get(key)
+            if path:
+                stat = os.stat(path)
+                parts.append(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+        parts.append(f"backend={self.config.get('backend', 'pytorch')}")
+        parts.append(f"conf={self.conf_threshold}:iou={self.iou_threshold}")
+        if self.cascade is not None:
+            parts.append(f"brand_conf={self.cascade.min_brand_conf}")
+        return "|".join(parts)
+
+    def infer_batch(self, images):
+        """``{label: count}`` for each of ``images``, from one batched forward pass."""
+        return [counts_to_dict(counts, self.names) for counts in self.infer_counts_batch(images)]
 
     def infer(self, image):
-        boxes = self.model(image, conf=self.conf_threshold, iou=self.iou_threshold, verbose=False)[0].boxes
-        results = {}
-        for cls, conf in zip(boxes.cls, boxes.conf):
-            label = self.names[int(cls)]
-            results[label] = results.get(label, 0) + 1
-        return results
+        return counts_to_dict(self.infer_counts(image), self.names)
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """LRU cache of per-image results keyed by a hash of the encoded image.
+
+    Entries expire ``ttl_s`` seconds after they were stored, and the least
+    recently used ones are evicted beyond ``max_entries`` or ``max_bytes``
+    (approximate: result arrays plus a fixed per-entry overhead). ``namespace``
+    should identify the model and everything else that changes results, so a
+    redeploy with new weights or thresholds never serves stale counts.
+    """
+
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, namespace, max_entries=4096, ttl_s=60.0, max_bytes=8 * 1024 * 1024):
+        self.namespace = namespace
+        self._hash_key = hashlib.blake2b(namespace.encode(), digest_size=32).digest()
+        self.max_entries = max_entries
+        self.ttl = ttl_s
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def key(self, payload):
+        """Hash of ``payload`` (bytes-like, or str for base64 bodies) within this cache's namespace."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        return hashlib.blake2b(payload, digest_size=16, key=self._hash_key).digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, size = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.bytes -= size
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        # Cached arrays are shared between requests, so make sure nobody changes them in place.
+        value.setflags(write=False)
+        size = value.nbytes + len(key) + self.ENTRY_OVERHEAD
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (value, time.monotonic(), size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
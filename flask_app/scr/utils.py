@@ -1,13 +1,13 @@
 import base64
+import cv2
+import numpy as np
 from PIL import Image
 from io import BytesIO
+from postprocess import combine_counts, counts_to_dict
 
-def match_and_combine_results(cam_results):
-    combined = {}
-    for result in cam_results:
-        for label, count in result.items():
-            combined[label] = max(combined.get(label, 0), count)
-    return combined
+def match_and_combine_results(cam_counts, names):
+    # Per-camera count arrays from DrinkModel.infer_counts; the max per class wins.
+    return counts_to_dict(combine_counts(cam_counts, len(names)), names)
 
 def count_total_products(results):
     return results.get("bottle", 0), results.get("can", 0)
@@ -16,14 +16,68 @@ def check_totals(results, bottles, cans):
     if bottles + cans != sum(results.values()):
         print("⚠ Warning: Mismatch in total quantities")
 
-def decode_base64_image(encoded_str):
+def to_rgb(image):
+    # PIL images (base64 endpoint) are RGB already; arrays (binary endpoint) are BGR.
+    if hasattr(image, "convert"):
+        return np.asarray(image.convert("RGB"))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+class ImageTooLargeError(ValueError):
+    pass
+
+# cv2 flags that decode a JPEG at 1/2, 1/4 or 1/8 scale in the DCT domain.
+REDUCED_DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                        4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+def check_image_limits(num_bytes, size=None, max_bytes=None, max_pixels=None):
+    if max_bytes and num_bytes > max_bytes:
+        raise ImageTooLargeError(f"Ảnh quá lớn: {num_bytes} bytes (tối đa {max_bytes})")
+    if size is not None and max_pixels and size[0] * size[1] > max_pixels:
+        raise ImageTooLargeError(f"Ảnh quá lớn: {size[0]}x{size[1]} pixel (tối đa {max_pixels})")
+
+def reduction_factor(size, target_size):
+    # Largest JPEG scale-down that still leaves the long side at least target_size,
+    # since the model letterboxes to target_size anyway.
+    for factor in (8, 4, 2):
+        if max(size) // factor >= target_size:
+            return factor
+    return 1
+
+def decode_base64_image(encoded_str, target_size=None, max_bytes=None, max_pixels=None):
     try:
         # Loại bỏ phần tiền tố "data:image/jpeg;base64,"
         if "," in encoded_str:
             base64_data = encoded_str.split(",")[1]
         else:
             base64_data = encoded_str
+        check_image_limits(len(base64_data) * 3 // 4, max_bytes=max_bytes)
         image_data = base64.b64decode(base64_data)
-        return Image.open(BytesIO(image_data)).convert("RGB")
+        # Image.open only parses the header, so limits are checked before decoding pixels.
+        image = Image.open(BytesIO(image_data))
+        check_image_limits(len(image_data), image.size, max_bytes, max_pixels)
+        if target_size and image.format == "JPEG":
+            width, height = image.size
+            factor = reduction_factor(image.size, target_size)
+            image.draft("RGB", (width // factor, height // factor))
+        return image.convert("RGB")
+    except ImageTooLargeError:
+        raise
     except Exception as e:
         raise ValueError(f"Không thể decode ảnh base64: {str(e)}")
+
+def decode_image_bytes(data, target_size=None, max_bytes=None, max_pixels=None):
+    # JPEG/PNG bytes straight to a BGR array (the layout Ultralytics expects), no PIL or base64.
+    check_image_limits(len(data), max_bytes=max_bytes)
+    factor = 1
+    if target_size or max_pixels:
+        try:
+            header = Image.open(BytesIO(data))
+        except Exception:
+            raise ValueError("Không thể decode ảnh: dữ liệu không phải JPEG/PNG hợp lệ")
+        check_image_limits(len(data), header.size, max_bytes, max_pixels)
+        if target_size and header.format == "JPEG":
+            factor = reduction_factor(header.size, target_size)
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_DECODE_FLAGS[factor])
+    if image is None:
+        raise ValueError("Không thể decode ảnh: dữ liệu không phải JPEG/PNG hợp lệ")
+    return image
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# app.py and gunicorn.conf.py import scr.* from the service directory, and the
+# modules shared with the camera app from the repository root (PYTHONPATH in the image).
+FLASK_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [FLASK_APP, os.path.dirname(FLASK_APP)]
@@ -0,0 +1,63 @@
+"""The PyTorch and ONNX Runtime backends count the same objects on the same images.
+
+Needs a trained checkpoint (DRINKSCAN_PARITY_MODEL=path/to/best.pt) and PyTorch,
+Ultralytics and ONNX Runtime; the checkpoint is exported with the DeepStream
+exporter. DRINKSCAN_PARITY_IMAGES may name a folder of shelf photos, otherwise
+synthetic frames are used.
+"""
+import argparse
+import glob
+import importlib.util
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from postprocess import count_classes
+from scr.backends import load_backend
+from scr.utils import to_rgb
+
+REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+EXPORTER = os.path.join(REPO, "DeepStream_YOLOv11", "models", "yolov11-det", "export_yolov11_det.py")
+
+
+def parity_images():
+    folder = os.environ.get("DRINKSCAN_PARITY_IMAGES")
+    if folder:
+        return [cv2.imread(path) for path in sorted(glob.glob(os.path.join(folder, "*.jpg")))[:16]]
+    from sources import SyntheticSource
+    source = SyntheticSource(1280, 720, num_frames=8, realtime=False)
+    return [source.read()[1].copy() for _ in range(8)]
+
+
+@pytest.fixture
+def exported_model(tmp_path, monkeypatch):
+    weights = os.environ.get("DRINKSCAN_PARITY_MODEL")
+    if not weights:
+        pytest.skip("DRINKSCAN_PARITY_MODEL not set")
+    for module in ("torch", "ultralytics", "onnx", "onnxruntime"):
+        pytest.importorskip(module)
+    spec = importlib.util.spec_from_file_location("export_yolov11_det", EXPORTER)
+    exporter = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(exporter)
+    # The exporter writes the .onnx and labels.txt to the working directory.
+    monkeypatch.chdir(tmp_path)
+    exporter.main(argparse.Namespace(weights=os.path.abspath(weights), size=[640], opset=16, simplify=False,
+                                     dynamic=True, batch=1))
+    return os.path.abspath(weights), str(tmp_path / (os.path.basename(weights).split(".pt")[0] + ".onnx"))
+
+
+def test_backends_count_alike(exported_model):
+    weights, onnx_path = exported_model
+    config = {"imgsz": 640, "conf_threshold": 0.25, "iou_threshold": 0.7}
+    pytorch = load_backend({**config, "backend": "pytorch", "model_path": weights})
+    onnxruntime = load_backend({**config, "backend": "onnxruntime", "model_path": onnx_path})
+    assert pytorch.names == onnxruntime.names
+
+    images = [to_rgb(image) for image in parity_images()]
+    for image, torch_result, onnx_result in zip(images, pytorch.detect(images), onnxruntime.detect(images)):
+        np.testing.assert_array_equal(count_classes(torch_result.class_ids, len(pytorch.names)),
+                                      count_classes(onnx_result.class_ids, len(onnxruntime.names)))
+        np.testing.assert_allclose(np.sort(torch_result.boxes, axis=0), np.sort(onnx_result.boxes, axis=0),
+                                   atol=1.0)
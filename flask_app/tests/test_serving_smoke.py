@@ -0,0 +1,104 @@
+"""Start-up smoke tests: the gunicorn config and the app load from the shipped config layout."""
+import importlib
+import importlib.util
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+
+from scr.config import CONFIG_PATH, load_config
+
+FLASK_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = ["bottle", "can", "pepsi"]
+
+
+def test_config_path_exists():
+    assert os.path.isfile(CONFIG_PATH)
+    assert load_config()["model_path"]
+
+
+@pytest.fixture
+def environ():
+    """``os.environ``, restored afterwards: gunicorn.conf.py sets thread variables with setdefault."""
+    saved = os.environ.copy()
+    yield os.environ
+    os.environ.clear()
+    os.environ.update(saved)
+
+
+def test_gunicorn_conf_imports(environ):
+    for var in ("WEB_CONCURRENCY", "INTRA_OP_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        environ.pop(var, None)
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", os.path.join(FLASK_APP, "gunicorn.conf.py"))
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    serving = load_config()["serving"]
+    assert conf.bind == serving["bind"]
+    assert conf.workers == serving["workers"]
+    assert conf.worker_class == "gthread"
+    assert int(environ["INTRA_OP_THREADS"]) == max(1, (os.cpu_count() or 1) // conf.workers)
+
+
+def write_onnx_detector(path, size=64):
+    """Export-shaped graph (``boxes``/``scores``/``classes``) that finds one can in every image."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+    outputs = {
+        "boxes": np.array([[[32, 32, 16, 16]]], np.float32),
+        "scores": np.array([[[0.9]]], np.float32),
+        "classes": np.array([[[NAMES.index("can")]]], np.float32),
+    }
+    # Zero shaped (batch, 1, 1), so the constant outputs follow the input batch size.
+    nodes = [
+        helper.make_node("ReduceMean", ["input"], ["mean"], axes=[1, 2, 3], keepdims=0),
+        helper.make_node("Constant", [], ["zero"], value=numpy_helper.from_array(np.array(0, np.float32))),
+        helper.make_node("Mul", ["mean", "zero"], ["flat"]),
+        helper.make_node("Constant", [], ["shape"], value=numpy_helper.from_array(np.array([-1, 1, 1], np.int64))),
+        helper.make_node("Reshape", ["flat", "shape"], ["batch_zero"]),
+    ]
+    for name, value in outputs.items():
+        nodes.append(helper.make_node("Constant", [], [name + "_value"], value=numpy_helper.from_array(value)))
+        nodes.append(helper.make_node("Add", [name + "_value", "batch_zero"], [name]))
+    graph = helper.make_graph(
+        nodes, "detector",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", 3, size, size])],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, ["batch", 1, value.shape[2]])
+         for name, value in outputs.items()],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def test_app_warms_up_and_serves(tmp_path, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    write_onnx_detector(str(tmp_path / "detector.onnx"))
+    (tmp_path / "labels.txt").write_text("\n".join(NAMES) + "\n")
+    config = load_config()
+    config.update(backend="onnxruntime", model_path=str(tmp_path / "detector.onnx"), imgsz=64)
+    config.pop("classes", None)
+    config.pop("classifier_path", None)
+    (tmp_path / "config.yaml").write_text(yaml.safe_dump(config))
+    monkeypatch.setenv("DRINK_CONFIG", str(tmp_path / "config.yaml"))
+    # What gunicorn.conf.py sets for each worker.
+    monkeypatch.setenv("INTRA_OP_THREADS", "2")
+
+    monkeypatch.delitem(sys.modules, "app", raising=False)
+    app_module = importlib.import_module("app")
+    try:
+        client = app_module.app.test_client()
+        assert client.get("/readyz").status_code == 200
+        assert app_module.decode_workers == 2
+        image = cv2.imencode(".jpg", np.full((360, 640, 3), 128, np.uint8))[1].tobytes()
+        cameras = len(app_module.CAMERA_IDS)
+        response = client.post("/process_drink_binary", data=image * cameras,
+                               headers={"Content-Type": "application/octet-stream",
+                                        "X-Image-Sizes": ",".join([str(len(image))] * cameras)})
+        assert response.status_code == 200
+        assert response.get_json()["total_products"] == 1
+    finally:
+        app_module.shutdown()
+        sys.modules.pop("app", None)
@@ -0,0 +1,289 @@
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+class LatestFrame:
+    """Single-slot buffer holding the most recent frame of one camera.
+
+    Every ``put`` bumps a monotonic sequence number, so readers can tell
+    whether the frame changed since they last looked at it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self._read_seq = 0
+        self.dropped = 0
+
+    def put(self, frame, timestamp=None):
+        with self._lock:
+            if self._seq > self._read_seq:
+                # The previous frame was overwritten before anyone read it, so nobody
+                # else holds it and its pool slot can be reused.
+                self.dropped += 1
+                if isinstance(self._frame, CapturedFrame):
+                    self._frame.release()
+            self._frame = frame
+            self._seq += 1
+            self._timestamp = time.monotonic() if timestamp is None else timestamp
+            return self._seq
+
+    def get(self):
+        """Return ``(frame, seq, timestamp)`` as one consistent snapshot."""
+        with self._lock:
+            self._read_seq = self._seq
+            self._lock.notify_all()
+            return self._frame, self._seq, self._timestamp
+
+    def wait_read(self, timeout=None):
+        """Block until the current frame has been read; ``False`` on timeout."""
+        with self._lock:
+            return self._lock.wait_for(lambda: self._read_seq == self._seq, timeout)
+
+    @property
+    def seq(self):
+        with self._lock:
+            return self._seq
+
+
+class CapturedFrame:
+    """One captured frame as seen by the model and by the display.
+
+    ``image`` is what goes to the model: either the raw BGR frame, or an RGB
+    letterboxed square when ``letterboxed`` is set, in which case ``scale``,
+    ``pad`` and ``content_size`` describe where the source pixels landed.
+    ``region`` is the ``(x, y, w, h)`` part of the source frame that ``image``
+    was cut from (the whole frame unless an ROI is set).
+    ``display`` is a low-resolution BGR copy of the whole frame for rendering;
+    ``None`` means render from ``image``. ``source`` is the whole frame as
+    captured, kept at full resolution for snapshots (``None`` if not kept).
+    Frames filled by a ``FramePool`` are views of a pool slot: ``detach`` copies
+    them out and hands the slot back.
+    """
+
+    def __init__(self, image, display=None, letterboxed=False, scale=1.0, pad=(0, 0), content_size=None, source_size=None,
+                 region=None, source=None):
+        self.image = image
+        self.display = display
+        self.source = source
+        self.letterboxed = letterboxed
+        self.scale = scale
+        self.pad = pad
+        self.content_size = content_size or (image.shape[1], image.shape[0])
+        self.source_size = source_size or (image.shape[1], image.shape[0])
+        self.region = region or (0, 0) + tuple(self.source_size)
+        self._release = None
+
+    def release(self):
+        """Hand a pooled frame's slot back to its pool; no-op for frames that own their arrays."""
+        if self._release is not None:
+            self._release()
+
+    def detach(self):
+        """This frame with arrays of its own; a pooled frame is copied and its slot released."""
+        if self._release is None:
+            return self
+        frame = CapturedFrame(self.image.copy(), None if self.display is None else self.display.copy(),
+                              self.letterboxed, self.scale, self.pad, self.content_size, self.source_size,
+                              self.region, None if self.source is None else self.source.copy())
+        self.release()
+        return frame
+
+    def to_region(self, xyxy):
+        """Map boxes from model input coordinates to pixels of the cropped region."""
+        if not self.letterboxed:
+            return xyxy
+        pad_x, pad_y = self.pad
+        return (xyxy - (pad_x, pad_y, pad_x, pad_y)) / self.scale
+
+    def to_source(self, xyxy):
+        """Map boxes from model input coordinates back to full-frame source pixels."""
+        x, y = self.region[:2]
+        if x or y:
+            return self.to_region(xyxy) + (x, y, x, y)
+        return self.to_region(xyxy)
+
+    def source_image(self):
+        """Best available BGR picture of the region the model saw, e.g. for snapshots."""
+        if self.source is not None:
+            x, y, w, h = self.region
+            return self.source[y:y + h, x:x + w]
+        if not self.letterboxed:
+            return self.image
+        pad_x, pad_y = self.pad
+        width, height = self.content_size
+        content = self.image[pad_y:pad_y + height, pad_x:pad_x + width]
+        return cv2.cvtColor(content, cv2.COLOR_RGB2BGR)
+
+
+class FramePool:
+    """Preallocated ring of letterboxed model inputs and display copies for one camera.
+
+    The capture thread reads into ``raw``, then ``fill`` resizes it straight into
+    a free slot, so steady-state capture allocates no image memory. A slot stays
+    taken until its frame is released (``CapturedFrame.detach`` or a
+    ``LatestFrame`` dropping it unread); when every slot is taken, ``fill``
+    drops the frame instead of overwriting one that may still be read.
+    The slot arrays can be supplied by the caller (e.g. from a
+    ``SharedFrameRing``), in which case ``depth`` is taken from them.
+    With a ``RegionOfInterest``, only that part of the frame is letterboxed for
+    the model; the display copy still shows the whole frame. With
+    ``keep_source`` (or caller-supplied ``source_bufs``) each slot also keeps
+    the captured frame at full resolution.
+    """
+
+    def __init__(self, source_size, imgsz=640, display_size=(640, 400), depth=4, pad_value=114,
+                 model_bufs=None, display_bufs=None, roi=None, keep_source=False, source_bufs=None, free=None):
+        self.source_size = source_size
+        region = roi.bounds(source_size) if roi is not None else (0, 0) + tuple(source_size)
+        region_x, region_y, region_w, region_h = region
+        self.scale = min(imgsz / region_w, imgsz / region_h)
+        new_w, new_h = round(region_w * self.scale), round(region_h * self.scale)
+        pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+        self.geometry = (self.scale, (pad_x, pad_y), (new_w, new_h), source_size, region)
+        self._crop = (slice(region_y, region_y + region_h), slice(region_x, region_x + region_w))
+        self._outside = roi.outside_mask(source_size, (new_w, new_h)) if roi is not None else None
+        self.pad_value = pad_value
+        src_w, src_h = source_size
+        self.raw = np.empty((src_h, src_w, 3), dtype=np.uint8)
+        if model_bufs is None:
+            model_bufs = np.empty((depth, imgsz, imgsz, 3), dtype=np.uint8)
+            display_bufs = np.empty((depth, display_size[1], display_size[0], 3), dtype=np.uint8)
+        depth = len(model_bufs)
+        if keep_source and source_bufs is None:
+            source_bufs = np.empty((depth, src_h, src_w, 3), dtype=np.uint8)
+        self._model_bufs = model_bufs
+        self._display_bufs = display_bufs
+        self._source_bufs = source_bufs
+        self._content = [buf[pad_y:pad_y + new_h, pad_x:pad_x + new_w] for buf in self._model_bufs]
+        self._frames = [
+            CapturedFrame(self._model_bufs[i], self._display_bufs[i], letterboxed=True, scale=self.scale,
+                          pad=(pad_x, pad_y), content_size=(new_w, new_h), source_size=source_size, region=region,
+                          source=None if source_bufs is None else source_bufs[i])
+            for i in range(depth)
+        ]
+        for i, frame in enumerate(self._frames):
+            frame._release = lambda i=i: self.release(i)
+        # Slots still taken when a pool replaces another on the same buffers stay taken,
+        # and get their padding when they come free.
+        self._free = deque(range(depth) if free is None else free)
+        for i in self._free:
+            model_bufs[i] = pad_value
+        self._unpadded = set(range(depth)) - set(self._free)
+        self._lock = threading.Lock()
+        self.last_index = None
+        self.exhausted = 0
+
+    def acquire(self):
+        """Index of a free slot, or ``None`` when all of them are taken."""
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, index):
+        with self._lock:
+            if index not in self._free:
+                self._free.append(index)
+
+    def free_slots(self):
+        with self._lock:
+            return list(self._free)
+
+    def fill(self, raw=None):
+        """Letterbox ``raw`` (default: ``self.raw``) into a free slot and return it, or ``None`` if none is free."""
+        raw = self.raw if raw is None else raw
+        i = self.acquire()
+        if i is None:
+            self.exhausted += 1
+            return None
+        self.last_index = i
+        if i in self._unpadded:
+            self._model_bufs[i] = self.pad_value
+            self._unpadded.discard(i)
+        content = self._content[i]
+        cv2.resize(raw[self._crop], (content.shape[1], content.shape[0]), dst=content, interpolation=cv2.INTER_LINEAR)
+        # The model expects RGB; convert in place so the padding stays untouched.
+        cv2.cvtColor(content, cv2.COLOR_BGR2RGB, dst=content)
+        if self._outside is not None:
+            np.copyto(content, np.uint8(self.pad_value), where=self._outside)
+        display = self._display_bufs[i]
+        cv2.resize(raw, (display.shape[1], display.shape[0]), dst=display, interpolation=cv2.INTER_AREA)
+        if self._source_bufs is not None:
+            np.copyto(self._source_bufs[i], raw)
+        return self._frames[i]
+
+
+class SharedFrameRing:
+    """Letterboxed model inputs and display copies for one camera, in shared memory.
+
+    A camera process fills the slots through a ``FramePool`` built on
+    ``model_bufs``/``display_bufs``; the inference process maps the same block by
+    ``name`` and wraps slots in ``CapturedFrame`` views, so pixels are never
+    pickled or copied between processes.
+    """
+
+    def __init__(self, imgsz=640, display_size=(640, 400), depth=12, name=None):
+        model_shape = (depth, imgsz, imgsz, 3)
+        display_shape = (depth, display_size[1], display_size[0], 3)
+        model_bytes = int(np.prod(model_shape))
+        create = name is None
+        size = model_bytes + int(np.prod(display_shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.owner = create
+        self.name = self.shm.name
+        self.model_bufs = np.ndarray(model_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.display_bufs = np.ndarray(display_shape, dtype=np.uint8, buffer=self.shm.buf, offset=model_bytes)
+
+    @property
+    def depth(self):
+        return len(self.model_bufs)
+
+    def frame(self, index, geometry, source_bufs=None):
+        """``CapturedFrame`` view of slot ``index`` with geometry from ``FramePool.geometry``."""
+        scale, pad, content_size, source_size, region = geometry
+        return CapturedFrame(self.model_bufs[index], self.display_bufs[index], letterboxed=True, scale=scale,
+                             pad=pad, content_size=content_size, source_size=source_size, region=region,
+                             source=None if source_bufs is None else source_bufs[index])
+
+    def close(self):
+        # Drop our array views first; SharedMemory refuses to close while views exist,
+        # which can still be the case for frames held elsewhere at shutdown.
+        self.model_bufs = self.display_bufs = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedSourceRing:
+    """Full-resolution captured frames of one camera process, in shared memory.
+
+    The camera process only learns the frame size from its first frame, so it
+    creates this block itself and sends its ``name``; the inference process maps
+    it with the same ``depth`` and ``frame_shape``.
+    """
+
+    def __init__(self, depth, frame_shape, name=None):
+        shape = (depth,) + tuple(frame_shape)
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=int(np.prod(shape)) if create else 0)
+        self.owner = create
+        self.name = self.shm.name
+        self.bufs = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def close(self):
+        self.bufs = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self.shm.unlink()
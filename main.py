@@ -1,88 +1,442 @@
+import argparse
 import cv2
+import itertools
+import json
 import numpy as np
 import os
+import queue
+import sys
 import threading
 import time
 from datetime import datetime
-import torch
-from ultralytics import YOLO
-from collections import defaultdict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from camera_process import CameraProcess
+from cascade import CascadeModel
+from change_detector import ChangeDetector
+from compositor import GridCompositor
+from frame_buffer import CapturedFrame, FramePool, LatestFrame
+from pipeline import DropOldestQueue, Pipeline, percentiles_ms
+from profiler import StageProfiler
+from roi import RegionOfInterest
+from snapshot_writer import SnapshotWriter
+from sources import FrameSource, configure_capture, open_source
+from tracker import IoUTracker
 from matching import generate_final_output, display_results_table, count_total_products
+from postprocess import class_names, count_classes, counts_to_dict, to_detections
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_MODEL = r"D:\AI_Progress\DrinkScan\checkpoints\Yolov11s-v15\detect\train\weights\best.pt"
+# Common 16:9 camera modes, tried in order when an ROI needs more pixels than model size.
+CAPTURE_SIZES = ((640, 360), (960, 540), (1280, 720), (1920, 1080))
+
 
 class MultiCameraYOLO:
-    def __init__(self, camera_ids=[0, 1, 2]):
+    def __init__(self, camera_ids=[0, 1, 2], capture_mode="letterbox", imgsz=640, change_threshold=0.01,
+                 infer_interval=3, headless=False, result_output=None, snapshot_format="jpg",
+                 snapshot_quality=90, snapshot_annotated=False, snapshot_sidecar=False,
+                 snapshot_interval=None, snapshot_on_change=False, snapshot_source="camera", sources=None, realtime=True,
+                 lossless=False, camera_processes=False, sync_grab=False, capture_backend="any",
+                 capture_settings=None, camera_settings=None, capture_size=None, perf_overlay=False, profile_output=None,
+                 profile_interval=5.0, model_path=DEFAULT_MODEL, warmup=True, rois=None, classifier_path=None,
+                 brand_conf=0.0):
         self.camera_ids = camera_ids
+        # Each camera id maps to a source spec (device index, video file, image folder,
+        # "synthetic..."); by default the id itself is the device index.
+        self.sources = dict(zip(camera_ids, sources if sources is not None else camera_ids))
+        self.realtime = realtime
+        # Lossless runs apply backpressure instead of dropping frames, so replays are deterministic.
+        self.lossless = lossless
+        # Capture and letterbox each camera in its own process, sharing frames through
+        # shared memory rings, so decode and resize do not compete for this process's GIL.
+        if camera_processes and capture_mode != "letterbox":
+            raise ValueError("camera_processes requires capture_mode='letterbox'")
+        self.camera_processes = camera_processes
+        self.shared_ring_depth = 12
+        # Sync grab latches every camera with grab() before decoding any of them with
+        # retrieve(), so each published set is close together in time.
+        if sync_grab and camera_processes:
+            raise ValueError("sync_grab cannot be combined with camera_processes")
+        self.sync_grab = sync_grab
+        self.sync_skews = deque(maxlen=10000)
+        # capture_settings (fourcc, fps, buffer_size) apply to every live camera;
+        # camera_settings maps a camera id to overrides for that camera.
+        self.capture_backend = capture_backend
+        self.capture_settings = capture_settings or {}
+        self.camera_settings = camera_settings or {}
+        # Rolling per-section timings and per-camera FPS; shown on the display with
+        # perf_overlay and appended to profile_output as JSON lines every profile_interval seconds.
+        self.profiler = StageProfiler()
+        self.perf_overlay = perf_overlay
+        self.profile_output = profile_output
+        self.profile_interval = profile_interval
+        self.frames_completed = 0
+        self._last_completed_at = None
+        self.e2e_latencies = deque(maxlen=100000)
+        # "letterbox": capture near model resolution into a reusable buffer pool.
+        # "full": legacy 1920x1080 capture, letterboxed by Ultralytics at inference time.
+        self.capture_mode = capture_mode
+        self.imgsz = imgsz
+        # Optional RegionOfInterest per camera id: only that part of the frame goes to
+        # the model, which allows a smaller imgsz; boxes are mapped back to the full frame.
+        self.rois = rois or {}
+        # Pool slots a camera holds at once: the newest unread frame, the one being copied
+        # out by the preprocess stage and the one being filled.
+        self.pool_depth = 4
+        self.pools = {}
+        # Fraction of changed thumbnail pixels that triggers a new inference; None disables gating.
+        self.change_threshold = change_threshold
+        self.change_detectors = {}
+        # Run the detector on every Nth frame per camera that reaches the infer stage;
+        # the trackers carry boxes in between.
+        self.infer_interval = infer_interval
+        self.trackers = {}
+        self._frame_counts = {}
+        # Headless mode skips all drawing and display and writes one JSON line per tick
+        # to result_output (a file path, or stdout when None or "-").
+        self.headless = headless
+        self.result_output = result_output
+        self.result_stream = None
+        # Snapshots are encoded off the hot path; they can also be taken every
+        # snapshot_interval seconds or whenever final_output changes.
+        self.snapshot_format = snapshot_format
+        self.snapshot_quality = snapshot_quality
+        self.snapshot_annotated = snapshot_annotated
+        self.snapshot_sidecar = snapshot_sidecar
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_on_change = snapshot_on_change
+        # "camera": snapshots are the frame as captured, at capture resolution, which costs
+        # a frame copy per capture in letterbox mode; "model": the smaller model input.
+        self.snapshot_source = snapshot_source
+        self._last_final_output = None
         self.cameras = {}
         self.frames = {}
+        self.source_fps = {}
+        self.last_results = {}
         self.running = True
-        self.capture_width = 1920
-        self.capture_height = 1080
+        # Resolution requested from live cameras (see _capture_size); capture_size overrides it,
+        # e.g. 1920x1080 for full-resolution snapshots in letterbox mode.
+        self.capture_size = capture_size
+        if capture_size is not None:
+            self.capture_width, self.capture_height = capture_size
+        elif capture_mode == "letterbox":
+            self.capture_width = imgsz
+            self.capture_height = imgsz * 9 // 16
+        else:
+            self.capture_width = 1920
+            self.capture_height = 1080
         self.display_width = 640
         self.display_height = 400
         self.output_dir = "captured_images"
-        self.model = self._load_model()
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # A .pt checkpoint, or an artifact from --export (.engine, .onnx, .torchscript, ...)
+        # that skips rebuilding the network on every boot.
+        self.model_path = model_path
+        # With a classifier, model_path is a generic bottle/can detector and brands come
+        # from classifying the crops (see CascadeModel).
+        self.classifier_path = classifier_path
+        self.brand_conf = brand_conf
+        self.cascade = None
+        self.warmup = warmup
         self.capture_threads = []
-        self._setup()
+        self._batch_buffer = None
+        self.new_frame_event = threading.Event()
+        self._last_seq = {}
+        self.stats_interval = 5.0
+        self.startup_times = {}
+        started = time.perf_counter()
+        # Load the model in the background while the cameras open; both take seconds.
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load") as loader:
+            model_future = loader.submit(self._load_model)
+            self._setup()
+            try:
+                self.model = model_future.result()
+            except Exception:
+                self._cleanup()
+                raise
+        self.class_names = self.cascade.names if self.cascade is not None else class_names(self.model.names)
+        if self.warmup:
+            self._warm_up()
+        self.startup_times["total_s"] = round(time.perf_counter() - started, 3)
+        self._log(f"Startup (s): {self.startup_times}")
 
     def _load_model(self):
-        model = YOLO(r"D:\AI_Progress\DrinkScan\checkpoints\Yolov11s-v15\detect\train\weights\best.pt")
-        return model.to(self.device)
+        started = time.perf_counter()
+        # torch/ultralytics are imported lazily: spawned camera processes re-import
+        # this module and should not pay for loading PyTorch.
+        import torch
+        from ultralytics import YOLO
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = YOLO(self.model_path, task="detect")
+        if str(self.model_path).endswith(".pt"):
+            # Exported artifacts are bound to a device when they are loaded.
+            model.to(self.device)
+        if self.classifier_path:
+            classifier = YOLO(self.classifier_path, task="classify")
+            if str(self.classifier_path).endswith(".pt"):
+                classifier.to(self.device)
+            self.cascade = CascadeModel(model, classifier, min_brand_conf=self.brand_conf, profiler=self.profiler)
+        self.startup_times["model_load_s"] = round(time.perf_counter() - started, 3)
+        return model
+
+    def _warm_up(self):
+        """Run dummy batches so CUDA/cuDNN setup and graph compilation happen before the first real frame."""
+        started = time.perf_counter()
+        if self.capture_mode == "letterbox":
+            image = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+            frame = CapturedFrame(image, letterboxed=True)
+        else:
+            frame = CapturedFrame(np.zeros((self.capture_height, self.capture_width, 3), dtype=np.uint8))
+        # The detector sees anything from one camera to all of them per batch.
+        for batch_size in sorted({len(self.camera_ids), 1}, reverse=True):
+            self.model(self._model_input([frame] * batch_size), device=self.device, verbose=False)
+        if self.cascade is not None:
+            self.cascade.warm_up(self.device)
+        self.startup_times["warmup_s"] = round(time.perf_counter() - started, 3)
 
     def _setup(self):
         os.makedirs(self.output_dir, exist_ok=True)
+        self.snapshot_writer = SnapshotWriter(self.output_dir, self.snapshot_format, self.snapshot_quality)
+        if self.headless:
+            if self.result_output in (None, "-"):
+                self.result_stream = sys.stdout
+            else:
+                self.result_stream = open(self.result_output, "a", encoding="utf-8")
+        started = time.perf_counter()
         self._init_cameras()
+        self.startup_times["cameras_open_s"] = round(time.perf_counter() - started, 3)
+        self._build_pipeline()
         self._start_capture_threads()
 
+    def _settings_for(self, cam_id):
+        return {**self.capture_settings, **self.camera_settings.get(cam_id, {})}
+
+    def _capture_size(self, cam_id):
+        """``(width, height)`` to request from live camera ``cam_id``.
+
+        In letterbox mode a camera with an ROI is asked for a larger mode (up to
+        1920x1080) so the ROI alone still spans ``imgsz`` pixels instead of being
+        upscaled into the model input. The driver may settle on another size.
+        """
+        size = (self.capture_width, self.capture_height)
+        roi = self.rois.get(cam_id)
+        if self.capture_mode != "letterbox" or self.capture_size is not None or roi is None:
+            return size
+        _, _, width, height = roi.rect
+        scale = self.imgsz / max(width * size[0], height * size[1])
+        if scale <= 1:
+            return size
+        return next((mode for mode in CAPTURE_SIZES if mode[0] >= size[0] * scale), CAPTURE_SIZES[-1])
+
     def _init_cameras(self):
-        for cam_id in self.camera_ids:
-            cap = cv2.VideoCapture(cam_id)
+        if self.camera_processes:
+            # Start every process first so the cameras open in parallel.
+            caps = {
+                cam_id: CameraProcess(self.sources[cam_id], self.imgsz, (self.display_width, self.display_height),
+                                      self.shared_ring_depth, self._capture_size(cam_id),
+                                      self.realtime, index, self.lossless, self.capture_backend,
+                                      self._settings_for(cam_id), self.rois.get(cam_id),
+                                      keep_source=self.snapshot_source == "camera")
+                for index, cam_id in enumerate(self.camera_ids)
+            }
+        else:
+            # Opening a camera can block for seconds, so open them all at once.
+            with ThreadPoolExecutor(max_workers=len(self.camera_ids) or 1, thread_name_prefix="camera-open") as pool:
+                futures = {
+                    cam_id: pool.submit(open_source, self.sources[cam_id], realtime=self.realtime, seed=index,
+                                        backend=self.capture_backend)
+                    for index, cam_id in enumerate(self.camera_ids)
+                }
+                caps = {cam_id: future.result() for cam_id, future in futures.items()}
+        for cam_id, cap in caps.items():
             if cap.isOpened():
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.capture_width)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.capture_height)
+                if not self.camera_processes and not isinstance(cap, FrameSource):
+                    actual = configure_capture(cap, *self._capture_size(cam_id), **self._settings_for(cam_id))
+                    self._log(f"Camera {cam_id} capture settings: {actual}")
                 self.cameras[cam_id] = cap
-                self.frames[cam_id] = np.zeros((self.capture_height, self.capture_width, 3), dtype=np.uint8)
+                self.frames[cam_id] = LatestFrame()
+                if getattr(cap, "fps", None):
+                    self.source_fps[cam_id] = cap.fps
             else:
-                print(f"Warning: Could not open camera {cam_id}")
+                cap.release()
+                self._log(f"Warning: Could not open camera {cam_id} ({self.sources[cam_id]})")
+
+    def _publish_frame(self, camera_id, frame, timestamp):
+        self.profiler.update_fps(f"capture.cam{camera_id}")
+        slot = self.frames[camera_id]
+        while self.lossless and self.running and not slot.wait_read(0.1):
+            pass
+        slot.put(frame, timestamp)
+        self.new_frame_event.set()
+
+    def _camera_reader_thread(self, camera_id):
+        cap = self.cameras[camera_id]
+        while self.running and not cap.exhausted:
+            item = cap.read(timeout=0.1)
+            if item is not None:
+                self._publish_frame(camera_id, *item)
+
+    def _prepare_frame(self, camera_id, raw, pool):
+        """Turn a raw capture into a ``CapturedFrame``; returns it with the (possibly new) pool."""
+        roi = self.rois.get(camera_id)
+        if self.capture_mode != "letterbox":
+            image = cv2.resize(raw, (self.capture_width, self.capture_height))
+            if roi is None:
+                return CapturedFrame(image), pool
+            display = cv2.resize(image, (self.display_width, self.display_height))
+            region = roi.bounds((self.capture_width, self.capture_height))
+            return CapturedFrame(roi.crop(image), display, source_size=(self.capture_width, self.capture_height),
+                                 region=region), pool
+        if pool is None or raw.shape != pool.raw.shape:
+            pool = FramePool((raw.shape[1], raw.shape[0]), self.imgsz,
+                             (self.display_width, self.display_height), self.pool_depth, roi=roi,
+                             keep_source=self.snapshot_source == "camera")
+            self.pools[camera_id] = pool
+        return pool.fill(raw), pool
+
+    def _raw_buffer(self, pool):
+        return pool.raw if self.capture_mode == "letterbox" and pool is not None else None
 
     def _capture_thread(self, camera_id):
+        cap = self.cameras[camera_id]
+        pool = None
         while self.running and camera_id in self.cameras:
-            ret, frame = self.cameras[camera_id].read()
-            if ret:
-                frame = cv2.resize(frame, (self.capture_width, self.capture_height))
-                self.frames[camera_id] = frame
-            time.sleep(0.033)
+            # read() blocks until the camera delivers the next frame, so no extra pacing is needed.
+            buffer = self._raw_buffer(pool)
+            started = time.perf_counter()
+            ret, raw = cap.read(buffer) if buffer is not None else cap.read()
+            if not ret:
+                if getattr(cap, "exhausted", False):
+                    break
+                time.sleep(0.01)
+                continue
+            timestamp = time.monotonic()
+            self.profiler.record(f"capture.cam{camera_id}", time.perf_counter() - started)
+            with self.profiler.section(f"preprocess.cam{camera_id}"):
+                frame, pool = self._prepare_frame(camera_id, raw, pool)
+            if frame is not None:
+                self._publish_frame(camera_id, frame, timestamp)
+
+    def _sync_capture_thread(self):
+        cam_ids = list(self.cameras)
+        pools = dict.fromkeys(cam_ids)
+        while self.running and cam_ids:
+            # Latch all cameras first; grab() is cheap, the decode happens in retrieve().
+            grabbed = []
+            for cam_id in cam_ids:
+                grabbed.append((cam_id, self.cameras[cam_id].grab(), time.monotonic()))
+            times = [timestamp for _, ok, timestamp in grabbed if ok]
+            if len(times) > 1:
+                self.sync_skews.append(max(times) - min(times))
+            if not times:
+                time.sleep(0.01)
+            for cam_id, ok, timestamp in grabbed:
+                cap = self.cameras[cam_id]
+                if not ok:
+                    if getattr(cap, "exhausted", False):
+                        cam_ids.remove(cam_id)
+                    continue
+                buffer = self._raw_buffer(pools[cam_id])
+                with self.profiler.section(f"capture.cam{cam_id}"):
+                    ret, raw = cap.retrieve(buffer) if buffer is not None else cap.retrieve()
+                if ret:
+                    with self.profiler.section(f"preprocess.cam{cam_id}"):
+                        frame, pools[cam_id] = self._prepare_frame(cam_id, raw, pools[cam_id])
+                    if frame is not None:
+                        self._publish_frame(cam_id, frame, timestamp)
 
     def _start_capture_threads(self):
+        if self.sync_grab:
+            thread = threading.Thread(target=self._sync_capture_thread, daemon=True)
+            thread.start()
+            self.capture_threads.append(thread)
+            return
+        target = self._camera_reader_thread if self.camera_processes else self._capture_thread
         for cam_id in self.cameras:
-            thread = threading.Thread(target=self._capture_thread, args=(cam_id,))
+            thread = threading.Thread(target=target, args=(cam_id,))
             thread.daemon = True
             thread.start()
             self.capture_threads.append(thread)
 
-    def _draw_bounding_boxes(self, frame, result):
+    def _display_image(self, captured, out=None):
+        """Write ``captured`` at display size into ``out`` (or a new array) and return it."""
+        if captured.display is not None:
+            if out is None:
+                return captured.display.copy()
+            np.copyto(out, captured.display)
+            return out
+        resized = cv2.resize(captured.image, (self.display_width, self.display_height), dst=out)
+        return resized if out is None else out
+
+    def _draw_bounding_boxes(self, frame, detections, captured, region_only=False):
+        """Draw boxes on ``frame``, a picture of the whole source frame or, with ``region_only``, of its ROI."""
+        if region_only:
+            boxes, (src_w, src_h) = captured.to_region(detections.boxes), captured.region[2:]
+        else:
+            boxes, (src_w, src_h) = captured.to_source(detections.boxes), captured.source_size
+        to_display = np.array([frame.shape[1] / src_w, frame.shape[0] / src_h] * 2)
         for box, confidence, class_id in zip(
-            result.boxes.xyxy.cpu().numpy(),
-            result.boxes.conf.cpu().numpy(),
-            result.boxes.cls.cpu().numpy()
+            boxes * to_display,
+            detections.confidences,
+            detections.class_ids
         ):
-            if confidence > 0.7:
-                x1, y1, x2, y2 = map(int, box)
-                label = f"{self.model.names[int(class_id)]} {confidence:.2f}"
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+            x1, y1, x2, y2 = map(int, box)
+            label = f"{self.class_names[int(class_id)]} {confidence:.2f}"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 1)
+            cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
         return frame
 
-    def capture_images(self):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        for cam_id, frame in self.frames.items():
-            if frame is not None:
-                filename = f"{self.output_dir}/yolov11s_camera_{cam_id}_{timestamp}.jpg"
-                cv2.imwrite(filename, frame)
-        print(f"Images captured at {timestamp}")
+    def _draw_region(self, frame, captured):
+        x, y, w, h = captured.region
+        src_w, src_h = captured.source_size
+        sx, sy = frame.shape[1] / src_w, frame.shape[0] / src_h
+        cv2.rectangle(frame, (int(x * sx), int(y * sy)), (int((x + w) * sx) - 1, int((y + h) * sy) - 1), (255, 128, 0), 1)
+        return frame
+
+    def _log(self, message):
+        # In headless mode stdout may carry JSON results, so keep messages off it.
+        print(message, file=sys.stderr if self.headless else sys.stdout)
+
+    def capture_images(self, reason="manual"):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        for cam_id in self.cameras:
+            # The last inferred frame is a private copy that matches its detections; the
+            # frame in the capture slot may be handed back to its pool at any time.
+            if cam_id not in self.last_results:
+                continue
+            frame, detections = self.last_results[cam_id]
+            annotate = None
+            sidecar = None
+            if detections is not None and self.snapshot_annotated:
+                annotate = lambda image, d=detections, f=frame: self._draw_bounding_boxes(image, d, f, region_only=True)
+            if detections is not None and self.snapshot_sidecar:
+                sidecar = self._snapshot_sidecar(cam_id, timestamp, reason, frame, detections)
+            self.snapshot_writer.submit(f"yolov11s_camera_{cam_id}_{timestamp}", frame.source_image(), annotate, sidecar)
+        self._log(f"Images captured at {timestamp} ({reason})")
+
+    def _snapshot_sidecar(self, cam_id, timestamp, reason, frame, detections):
+        boxes = frame.to_source(detections.boxes)
+        return {
+            "camera": cam_id,
+            "timestamp": timestamp,
+            "reason": reason,
+            "region": list(frame.region),
+            "detections": [
+                {"label": self.class_names[int(class_id)], "confidence": round(float(confidence), 4),
+                 "box": [round(float(v), 1) for v in box]}
+                for box, confidence, class_id in zip(boxes, detections.confidences, detections.class_ids)
+            ],
+            "final_output": self._last_final_output,
+        }
 
     def create_results_table_image(self, final_output, total_products, combined_quantities):
         table_image = np.zeros((self.display_height, self.display_width, 3), dtype=np.uint8)
+        return self._draw_results_table(table_image, final_output, total_products, combined_quantities)
+
+    def _draw_results_table(self, table_image, final_output, total_products, combined_quantities):
         font = cv2.FONT_HERSHEY_SIMPLEX
         font_scale = 0.6
         font_color = (255, 255, 255)
@@ -106,77 +460,460 @@ class MultiCameraYOLO:
         cv2.putText(table_image, "+-------------------+----------+", (10, y_offset), font, font_scale, font_color, line_type)
         return table_image
 
-    def run(self):
-        while self.running:
-            frames = []
-            results = []
-            for cam_id in self.camera_ids:
-                if cam_id in self.cameras and self.frames.get(cam_id) is not None:
-                    frame = self.frames[cam_id]
-                    result = self.model(frame, device=self.device)
-                    if result:
-                        frames.append(frame)
-                        results.append(result[0])
-
-            if frames:
-                print(f"Active cameras: {len(frames)}")
-                print(f"YOLO results: {len(results)}")
-
-                cam_results = []
-                for result in results:
-                    detections = defaultdict(int)
-                    if hasattr(result, 'boxes') and result.boxes is not None:
-                        for class_id, confidence in zip(result.boxes.cls.cpu().numpy(), result.boxes.conf.cpu().numpy()):
-                            if confidence > 0.7:
-                                detections[self.model.names[int(class_id)]] += 1
-                    cam_results.append(detections)
-
-                final_output = generate_final_output(cam_results)
-                total_bottles, total_cans = count_total_products(final_output)
-                total_products = total_bottles + total_cans
-                beverage_only = {k: v for k, v in final_output.items() if k not in ['bottle', 'can']}
-                combined_quantities = sum(beverage_only.values())
-                display_results_table(final_output)
-
-                frames_with_boxes = []
-                for frame, result in zip(frames, results):
-                    frame_with_boxes = frame
-                    if hasattr(result, 'boxes') and result.boxes is not None and len(result.boxes) > 0:
-                        frame_with_boxes = self._draw_bounding_boxes(frame, result)
-                    frame_with_boxes = cv2.resize(frame_with_boxes, (self.display_width, self.display_height))
-                    frames_with_boxes.append(frame_with_boxes)
-
-                table_image = self.create_results_table_image(final_output, total_products, combined_quantities)
-
-                if len(frames) == 1:
-                    combined_frame = frames_with_boxes[0]
-                elif len(frames) == 2:
-                    top_row = np.hstack((frames_with_boxes[0], frames_with_boxes[1]))
-                    combined_frame = np.vstack((top_row, np.zeros((self.display_height, self.display_width * 2, 3), dtype=np.uint8)))
+    def _collect_new_frames(self, last_seq):
+        cam_ids, frames, timestamps = [], [], []
+        for cam_id in self.camera_ids:
+            if cam_id not in self.cameras:
+                continue
+            frame, seq, timestamp = self.frames[cam_id].get()
+            if frame is None or seq == last_seq.get(cam_id):
+                continue
+            last_seq[cam_id] = seq
+            cam_ids.append(cam_id)
+            # Copy out of the capture pool: the pipeline can hold a frame for longer than
+            # the pool takes to come round to its slot again.
+            frames.append(frame.detach())
+            timestamps.append(timestamp)
+        return cam_ids, frames, timestamps
+
+    def _build_pipeline(self):
+        self.infer_queue = DropOldestQueue(maxsize=1)
+        self.pipeline = Pipeline(lossless=self.lossless)
+        self.pipeline.add_stage("preprocess", self._preprocess_stage, outbox=self.infer_queue)
+        if self.headless:
+            # Every tick is a result record, so give the writer some slack before dropping.
+            self.output_queue = DropOldestQueue(maxsize=64)
+            self.pipeline.add_stage("infer", self._infer_stage, inbox=self.infer_queue, outbox=self.output_queue)
+            self.pipeline.add_stage("output", self._output_stage, inbox=self.output_queue)
+        else:
+            self.render_queue = DropOldestQueue(maxsize=1)
+            self.display_queue = DropOldestQueue(maxsize=1)
+            self.compositor = GridCompositor(len(self.camera_ids), (self.display_width, self.display_height))
+            self.pipeline.add_stage("infer", self._infer_stage, inbox=self.infer_queue, outbox=self.render_queue)
+            self.pipeline.add_stage("render", self._render_stage, inbox=self.render_queue, outbox=self.display_queue)
+
+    def _preprocess_stage(self):
+        if not self.new_frame_event.wait(0.1):
+            return None
+        self.new_frame_event.clear()
+        cam_ids, frames, timestamps = self._collect_new_frames(self._last_seq)
+        if not frames:
+            return None
+        return {"cam_ids": cam_ids, "frames": frames, "timestamps": timestamps}
+
+    def _should_infer(self, cam_id, frame):
+        count = self._frame_counts.get(cam_id, -1) + 1
+        self._frame_counts[cam_id] = count
+        if count % self.infer_interval:
+            return False
+        return self._scene_changed(cam_id, frame)
+
+    def _scene_changed(self, cam_id, frame):
+        if self.change_threshold is None:
+            return True
+        if cam_id not in self.change_detectors:
+            self.change_detectors[cam_id] = ChangeDetector(threshold=self.change_threshold)
+        # With an ROI, only changes inside it matter, so watch the model input instead.
+        image = frame.display if frame.display is not None and cam_id not in self.rois else frame.image
+        # Fast replays run at whatever speed the machine manages, so their refresh is timed
+        # by frame count at the source frame rate to keep benchmark runs deterministic.
+        now = None if self.realtime else self._frame_counts[cam_id] / self.source_fps.get(cam_id, 30.0)
+        return self.change_detectors[cam_id].changed(image, now)
+
+    def _model_input(self, frames):
+        if not frames[0].letterboxed:
+            return [frame.image for frame in frames]
+        # Letterboxed frames are already RGB at imgsz, so skip Ultralytics preprocessing
+        # and hand it a normalised BCHW tensor built from one reusable batch buffer.
+        if self._batch_buffer is None:
+            self._batch_buffer = np.empty((len(self.camera_ids),) + frames[0].image.shape, dtype=np.uint8)
+        batch = self._batch_buffer[:len(frames)]
+        for i, frame in enumerate(frames):
+            batch[i] = frame.image
+        import torch
+        return torch.from_numpy(batch).to(self.device).permute(0, 3, 1, 2).float().div_(255)
+
+    def _infer_stage(self, batch):
+        # Cameras that are between detector runs or whose scene is unchanged reuse
+        # their tracked detections on the fresh frame. The schedule and the change gate
+        # run here rather than in the preprocess stage: batches can be dropped on the way,
+        # and only frames this stage receives may count towards the next detector run or
+        # move a camera's reference frame.
+        infer = []
+        with self.profiler.section("change_gate"):
+            for cam_id, frame in zip(batch["cam_ids"], batch["frames"]):
+                run = self._should_infer(cam_id, frame)
+                infer.append(run or cam_id not in self.last_results)
+        infer_frames = [frame for frame, flag in zip(batch["frames"], infer) if flag]
+        new_results = []
+        frame_ages = {}
+        if infer_frames:
+            inferred_at = time.monotonic()
+            infer_cam_ids = [cam_id for cam_id, flag in zip(batch["cam_ids"], infer) if flag]
+            with self.profiler.section("inference"):
+                new_results = self._detect(infer_cam_ids, infer_frames)
+            frame_ages = {
+                cam_id: round((inferred_at - ts) * 1000, 1)
+                for cam_id, ts, flag in zip(batch["cam_ids"], batch["timestamps"], infer) if flag
+            }
+        postprocess_started = time.perf_counter()
+        new_results = iter(new_results)
+        for cam_id, frame, flag in zip(batch["cam_ids"], batch["frames"], infer):
+            if flag:
+                detections = self._track(cam_id, next(new_results))
+            else:
+                detections = self.last_results[cam_id][1]
+            self.last_results[cam_id] = (frame, detections)
+
+        cam_ids = []
+        frames = []
+        results = []
+        for cam_id in self.camera_ids:
+            if cam_id in self.last_results:
+                frame, result = self.last_results[cam_id]
+                cam_ids.append(cam_id)
+                frames.append(frame)
+                results.append(result)
+
+        num_classes = len(self.class_names)
+        cam_counts = [count_classes(result.class_ids, num_classes) for result in results]
+        self.profiler.record("postprocess", time.perf_counter() - postprocess_started)
+
+        aggregation_started = time.perf_counter()
+        final_output = generate_final_output(cam_counts, self.class_names)
+        changed = self._last_final_output is not None and final_output != self._last_final_output
+        self._last_final_output = final_output
+        if changed and self.snapshot_on_change:
+            self.capture_images(reason="change")
+        total_bottles, total_cans = count_total_products(final_output)
+        beverage_only = {k: v for k, v in final_output.items() if k not in ['bottle', 'can']}
+        self.profiler.record("aggregation", time.perf_counter() - aggregation_started)
+        return {
+            "cam_ids": cam_ids,
+            "frames": frames,
+            "results": results,
+            "cam_counts": cam_counts,
+            "frame_ages": frame_ages,
+            "captured_at": dict(zip(batch["cam_ids"], batch["timestamps"])),
+            "final_output": final_output,
+            "total_products": total_bottles + total_cans,
+            "combined_quantities": sum(beverage_only.values()),
+        }
+
+    def _detect(self, cam_ids, frames):
+        """``Detections`` for each frame, from one batched forward pass over all of them."""
+        model_input = self._model_input(frames)
+        if self.cascade is not None:
+            return self.cascade.predict(model_input, [frame.image for frame in frames], rgb=frames[0].letterboxed,
+                                        keys=cam_ids, device=self.device)
+        results = self.model(model_input, device=self.device, verbose=not self.headless)
+        return [to_detections(result) for result in results]
+
+    def _track(self, cam_id, detections):
+        if cam_id not in self.trackers:
+            self.trackers[cam_id] = IoUTracker()
+        return self.trackers[cam_id].update(*detections)
+
+    def _render_stage(self, tick):
+        frames = tick["frames"]
+        results = tick["results"]
+        final_output = tick["final_output"]
+        if tick["frame_ages"]:
+            print(f"Frame age at inference (ms): {tick['frame_ages']}")
+        print(f"Active cameras: {len(frames)}")
+        print(f"YOLO results: {len(results)}")
+        display_results_table(final_output)
+        self._complete_tick(tick)
+
+        compositor = self.compositor
+        totals = (tick["total_products"], tick["combined_quantities"])
+        with compositor.lock, self.profiler.section("draw"):
+            for cam_id, frame, result in zip(tick["cam_ids"], frames, results):
+                tile = compositor.camera_tile(self.camera_ids.index(cam_id))
+                self._display_image(frame, out=tile)
+                if cam_id in self.rois:
+                    self._draw_region(tile, frame)
+                if len(result.boxes) > 0:
+                    self._draw_bounding_boxes(tile, result, frame)
+            compositor.update_table(
+                (tuple(final_output.items()), totals),
+                lambda tile: self._draw_results_table(tile, final_output, *totals),
+            )
+            if self.perf_overlay:
+                self.profiler.draw_overlay(compositor.camera_tile(0))
+        return compositor.canvas
+
+    def _complete_tick(self, tick, now=None):
+        now = time.monotonic() if now is None else now
+        for cam_id, ts in tick["captured_at"].items():
+            self.e2e_latencies.append(now - ts)
+            self.profiler.update_fps(f"cam{cam_id}")
+        self.frames_completed += len(tick["captured_at"])
+        self._last_completed_at = now
+
+    def _output_stage(self, tick):
+        now = time.monotonic()
+        self._complete_tick(tick, now)
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "cameras": {
+                cam_id: counts_to_dict(counts, self.class_names)
+                for cam_id, counts in zip(tick["cam_ids"], tick["cam_counts"])
+            },
+            "final_output": tick["final_output"],
+            "total_products": tick["total_products"],
+            "combined_quantities": tick["combined_quantities"],
+            "frame_age_ms": tick["frame_ages"],
+            "latency_ms": {cam_id: round((now - ts) * 1000, 1) for cam_id, ts in tick["captured_at"].items()},
+            "capture_skew_ms": round((max(tick["captured_at"].values()) - min(tick["captured_at"].values())) * 1000, 1),
+        }
+        self.result_stream.write(json.dumps(record) + "\n")
+        self.result_stream.flush()
+
+    def pipeline_stats(self):
+        stats = {
+            "capture": {
+                cam_id: {"frames": slot.seq, "dropped": slot.dropped + getattr(self.cameras[cam_id], "skipped", 0)
+                         + getattr(self.cameras[cam_id], "no_free_slot", 0)
+                         + (self.pools[cam_id].exhausted if cam_id in self.pools else 0)}
+                for cam_id, slot in self.frames.items()
+            }
+        }
+        stats["change_gate"] = {
+            cam_id: {"inferred": detector.changed_count, "skipped": detector.skipped_count}
+            for cam_id, detector in self.change_detectors.items()
+        }
+        if self.sync_grab:
+            stats["sync_skew"] = percentiles_ms(self.sync_skews)
+        stats.update(self.pipeline.stats())
+        stats["snapshots"] = self.snapshot_writer.stats()
+        if self.cascade is not None:
+            stats["cascade"] = self.cascade.stats()
+        if not self.headless:
+            stats["display"] = {"queue_depth": self.display_queue.qsize(), "dropped": self.display_queue.dropped}
+        return stats
+
+    def _display_tick(self):
+        # imshow/waitKey stay on the main thread; everything upstream runs in the pipeline stages.
+        try:
+            combined_frame = self.display_queue.get(timeout=0.005)
+        except queue.Empty:
+            combined_frame = None
+        started = time.perf_counter()
+        if combined_frame is not None:
+            # imshow copies the canvas, so the render stage only waits for that copy.
+            with self.compositor.lock:
+                cv2.imshow("Multi-Camera YOLO Detection", combined_frame)
+
+        key = cv2.waitKey(1) & 0xFF
+        if combined_frame is not None:
+            self.profiler.record("display", time.perf_counter() - started)
+        if key == ord('q'):
+            self.running = False
+        elif key == ord(' '):
+            self.capture_images()
+
+    def _replay_finished(self):
+        """All sources ran dry and every captured frame has left the pipeline."""
+        if any(thread.is_alive() for thread in self.capture_threads):
+            return False
+        consumed = all(slot.seq == self._last_seq.get(cam_id, 0) for cam_id, slot in self.frames.items())
+        return consumed and self.pipeline.idle()
+
+    def benchmark_report(self, elapsed):
+        return {
+            "frames": self.frames_completed,
+            "elapsed_s": round(elapsed, 3),
+            "fps": round(self.frames_completed / elapsed, 2) if elapsed > 0 else 0.0,
+            "stages": {
+                stage.name: stage.latency_percentiles()
+                for stage in self.pipeline.stages if stage.inbox is not None
+            },
+            "end_to_end": percentiles_ms(self.e2e_latencies),
+            "sync_skew": percentiles_ms(self.sync_skews) if self.sync_grab else None,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+            "startup": self.startup_times,
+            "profile": self.profiler.snapshot(),
+        }
+
+    def _dump_profile(self):
+        record = {"timestamp": datetime.now().isoformat(timespec="milliseconds"), **self.profiler.snapshot()}
+        with open(self.profile_output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def run(self, duration=None):
+        self.pipeline.start()
+        started = time.monotonic()
+        last_stats = time.monotonic()
+        last_snapshot = time.monotonic()
+        last_profile = time.monotonic()
+        idle_since = None
+        try:
+            while self.running:
+                if self.headless:
+                    time.sleep(0.1)
                 else:
-                    top_row = np.hstack((frames_with_boxes[0], frames_with_boxes[1]))
-                    bottom_row = np.hstack((frames_with_boxes[2], table_image))
-                    combined_frame = np.vstack((top_row, bottom_row))
+                    self._display_tick()
 
-                if combined_frame is not None and combined_frame.size != 0:
-                    cv2.imshow("Multi-Camera YOLO Detection", combined_frame)
+                if duration is not None and time.monotonic() - started >= duration:
+                    self.running = False
+                # Idle has to hold across two checks to cover a batch being handed between stages.
+                if self._replay_finished():
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since >= 0.25:
+                        self.running = False
                 else:
-                    print("Invalid or empty frame")
+                    idle_since = None
+
+                if self.snapshot_interval and time.monotonic() - last_snapshot >= self.snapshot_interval:
+                    self.capture_images(reason="periodic")
+                    last_snapshot = time.monotonic()
+
+                if time.monotonic() - last_stats >= self.stats_interval:
+                    # stderr, so stats never interleave with JSON results on stdout.
+                    print(f"Pipeline stats: {self.pipeline_stats()}", file=sys.stderr)
+                    last_stats = time.monotonic()
 
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                self.running = False
-            elif key == ord(' '):
-                self.capture_images()
+                if self.profile_output and time.monotonic() - last_profile >= self.profile_interval:
+                    self._dump_profile()
+                    last_profile = time.monotonic()
+        except KeyboardInterrupt:
+            pass
 
+        # Replays end at their last result, not after the idle grace period.
+        finished = self._last_completed_at if idle_since is not None and self._last_completed_at else time.monotonic()
+        elapsed = finished - started
         self._cleanup()
+        if self.profile_output:
+            self._dump_profile()
+        return self.benchmark_report(elapsed)
 
     def _cleanup(self):
         self.running = False
+        self.pipeline.stop()
+        self.snapshot_writer.close()
         for cap in self.cameras.values():
             cap.release()
-        cv2.destroyAllWindows()
+        if self.result_stream is not None and self.result_stream is not sys.stdout:
+            self.result_stream.close()
+        if not self.headless:
+            cv2.destroyAllWindows()
+
+
+def export_model(model_path, export_format, imgsz, batch):
+    """Convert a .pt checkpoint once so later boots can load the artifact directly."""
+    from ultralytics import YOLO
+    import torch
+    device = 0 if torch.cuda.is_available() else "cpu"
+    # Dynamic batch up to the camera count, since only changed cameras are batched together.
+    return YOLO(model_path).export(format=export_format, imgsz=imgsz, batch=batch, dynamic=True, device=device)
+
+
+def source_camera_ids(sources):
+    """Camera ids for ``sources``: live devices keep their index, other sources take the lowest free ids."""
+    devices = [int(spec) if str(spec).isdigit() else None for spec in sources]
+    free = (i for i in itertools.count() if i not in devices)
+    return [index if index is not None else next(free) for index in devices]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="DrinkScan multi-camera YOLO detection")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model checkpoint (.pt) or exported artifact")
+    parser.add_argument("--export", default=None, choices=["engine", "onnx", "torchscript", "openvino"],
+                        help="Export --model for the given cameras to this format and exit")
+    parser.add_argument("--classifier", default=None,
+                        help="Brand classifier for a two-stage cascade; --model is then a bottle/can detector")
+    parser.add_argument("--brand-conf", type=float, default=0.0,
+                        help="Minimum classifier confidence to count a brand in cascade mode")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the warm-up inference at startup")
+    parser.add_argument("--imgsz", type=int, default=640, help="Model input size (default 640)")
+    parser.add_argument("--roi", action="append", default=[], metavar="CAM:REGION",
+                        help="Region of interest for camera CAM as fractions of the frame: x,y,w,h or "
+                             "x1,y1;x2,y2;x3,y3... for a polygon. Repeat per camera")
+    parser.add_argument("--cameras", nargs="+", type=int, default=[0, 1, 2], help="Camera indices (default 0 1 2)")
+    parser.add_argument("--sources", nargs="+", default=None,
+                        help="Camera sources instead of --cameras: device index, URL, video file, "
+                             "image folder or synthetic[:WxH[@FPS[:FRAMES]]]")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Headless replay that prints FPS, stage latency percentiles and peak memory")
+    parser.add_argument("--pace", choices=["realtime", "fast"], default="realtime",
+                        help="Replay sources at their frame rate or as fast as possible (lossless)")
+    parser.add_argument("--camera-processes", action="store_true",
+                        help="Capture each camera in its own process, sharing frames via shared memory")
+    parser.add_argument("--sync-grab", action="store_true",
+                        help="Grab all cameras before retrieving any, for time-aligned frame sets")
+    parser.add_argument("--backend", default="any", choices=["any", "v4l2", "dshow", "msmf", "gstreamer", "ffmpeg"],
+                        help="OpenCV capture backend for live cameras")
+    parser.add_argument("--fourcc", default=None, help="Camera pixel format, e.g. MJPG")
+    parser.add_argument("--capture-size", default=None, type=lambda s: tuple(int(v) for v in s.split("x")),
+                        help="Camera resolution as WxH (default: near --imgsz, larger for cameras with an ROI)")
+    parser.add_argument("--fps", type=float, default=None, help="Requested camera frame rate")
+    parser.add_argument("--buffer-size", type=int, default=None, help="Driver buffer size in frames (1 = lowest lag)")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after N seconds")
+    parser.add_argument("--benchmark-report", default=None, help="Also write the benchmark report to this JSON file")
+    parser.add_argument("--headless", action="store_true", help="No display; write JSON lines per tick")
+    parser.add_argument("--output", default="-", help="Headless result file, '-' for stdout (default)")
+    parser.add_argument("--snapshot-format", default="jpg", choices=["jpg", "png", "webp"], help="Snapshot image format")
+    parser.add_argument("--snapshot-quality", type=int, default=90, help="Snapshot quality 0-100 (default 90)")
+    parser.add_argument("--snapshot-annotated", action="store_true", help="Also save snapshots with boxes drawn")
+    parser.add_argument("--snapshot-sidecar", action="store_true", help="Save a JSON file with detections per snapshot")
+    parser.add_argument("--snapshot-interval", type=float, default=None, help="Take snapshots every N seconds")
+    parser.add_argument("--snapshot-on-change", action="store_true", help="Take snapshots when the counts change")
+    parser.add_argument("--snapshot-source", default="camera", choices=["camera", "model"],
+                        help="Save the frame as captured (default; see --capture-size) or the smaller model "
+                             "input, which saves a frame copy per capture")
+    parser.add_argument("--perf-overlay", action="store_true", help="Draw FPS and stage timings on the display")
+    parser.add_argument("--profile-output", default=None, help="Append stage timing snapshots to this JSON lines file")
+    parser.add_argument("--profile-interval", type=float, default=5.0, help="Seconds between profile snapshots")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    capture_system = MultiCameraYOLO()
-    capture_system.run()
\ No newline at end of file
+    args = parse_args()
+    sources = args.sources if args.sources is not None else args.cameras
+    if args.export:
+        print(f"Exported model: {export_model(args.model, args.export, args.imgsz, len(sources))}")
+        sys.exit(0)
+    fast = args.pace == "fast"
+    output = args.output
+    if args.benchmark and output == "-":
+        output = os.devnull
+    rois = {}
+    for roi_arg in args.roi:
+        cam_id, _, region = roi_arg.partition(":")
+        rois[int(cam_id)] = RegionOfInterest.parse(region)
+    capture_system = MultiCameraYOLO(
+        camera_ids=source_camera_ids(sources),
+        imgsz=args.imgsz,
+        rois=rois,
+        sources=sources,
+        realtime=not fast,
+        lossless=fast,
+        camera_processes=args.camera_processes,
+        sync_grab=args.sync_grab,
+        capture_backend=args.backend,
+        capture_settings={"fourcc": args.fourcc, "fps": args.fps, "buffer_size": args.buffer_size},
+        capture_size=args.capture_size,
+        headless=args.headless or args.benchmark,
+        result_output=output,
+        snapshot_format=args.snapshot_format,
+        snapshot_quality=args.snapshot_quality,
+        snapshot_annotated=args.snapshot_annotated,
+        snapshot_sidecar=args.snapshot_sidecar,
+        snapshot_interval=args.snapshot_interval,
+        snapshot_on_change=args.snapshot_on_change,
+        snapshot_source=args.snapshot_source,
+        perf_overlay=args.perf_overlay,
+        profile_output=args.profile_output,
+        profile_interval=args.profile_interval,
+        model_path=args.model,
+        classifier_path=args.classifier,
+        brand_conf=args.brand_conf,
+        warmup=not args.no_warmup,
+    )
+    report = capture_system.run(duration=args.duration)
+    if args.benchmark:
+        print(json.dumps(report, indent=2))
+        if args.benchmark_report:
+            with open(args.benchmark_report, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
\ No newline at end of file
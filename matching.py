@@ -1,20 +1,18 @@
 from tabulate import tabulate
 
-def match_and_combine_results(cam_results):
-    combined_results = {}
-    for cam_result in cam_results:
-        for label, quantity in cam_result.items():
-            combined_results[label] = max(combined_results.get(label, 0), quantity)
-    return combined_results
+from postprocess import combine_counts, counts_to_dict
+
+def match_and_combine_results(cam_counts, num_classes):
+    # Per-camera count arrays from postprocess.count_classes; the max per class wins.
+    return combine_counts(cam_counts, num_classes)
 
 def count_total_products(combined_results):
     total_bottles = combined_results.get("bottle", 0)
     total_cans = combined_results.get("can", 0)
     return total_bottles, total_cans
 
-def generate_final_output(cam_results):
-    combined_results = match_and_combine_results(cam_results)
-    total_bottles, total_cans = count_total_products(combined_results)
+def generate_final_output(cam_counts, names):
+    combined_results = counts_to_dict(match_and_combine_results(cam_counts, len(names)), names)
     return combined_results
 
 def display_results_table(combined_results):
@@ -0,0 +1,167 @@
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+def percentiles_ms(values, percentiles=(50, 95, 99)):
+    """Percentiles in milliseconds of durations given in seconds."""
+    if not values:
+        return {}
+    result = np.percentile(np.fromiter(values, dtype=np.float64), percentiles) * 1000
+    return {f"p{p}_ms": round(float(v), 2) for p, v in zip(percentiles, result)}
+
+
+class DropOldestQueue:
+    """Bounded FIFO that never blocks the producer.
+
+    When the queue is full, ``put`` discards the oldest item to make room, so a
+    slow consumer always sees the freshest data and the producer keeps running.
+    ``put(block=True)`` instead waits for space, for runs that must not lose
+    items (e.g. deterministic benchmarks).
+    """
+
+    def __init__(self, maxsize=1):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item, block=False, timeout=None):
+        """Enqueue ``item``; returns ``False`` only if a blocking put timed out."""
+        with self._cond:
+            if block:
+                if not self._cond.wait_for(lambda: len(self._items) < self.maxsize, timeout):
+                    return False
+            elif len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+
+class Stage:
+    """Worker thread that applies ``func`` to items taken from ``inbox``.
+
+    A stage without an inbox is a source: ``func`` is called with no arguments
+    and is expected to block until it has something to emit. Whatever ``func``
+    returns is forwarded to ``outbox`` unless it is ``None``; with ``lossless``
+    the stage waits for room in the outbox instead of dropping its oldest item.
+    Inbox stages record how long each ``func`` call took in ``latencies``.
+    """
+
+    def __init__(self, name, func, inbox=None, outbox=None, poll_interval=0.1, lossless=False, history=10000):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.poll_interval = poll_interval
+        self.lossless = lossless
+        self.processed = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=history)
+        self.busy = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"stage-{name}", daemon=True)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.inbox is None:
+                    output = self.func()
+                    if output is None:
+                        continue
+                else:
+                    try:
+                        item = self.inbox.get(timeout=self.poll_interval)
+                    except queue.Empty:
+                        continue
+                    self.busy = True
+                    started = time.perf_counter()
+                    output = self.func(item)
+                    self.latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                self.errors += 1
+                self.busy = False
+                print(f"Stage '{self.name}' failed: {e}", file=sys.stderr)
+                continue
+            self.processed += 1
+            if output is not None and self.outbox is not None:
+                if not self.lossless:
+                    self.outbox.put(output)
+                else:
+                    while not self.outbox.put(output, block=True, timeout=self.poll_interval):
+                        if self._stop.is_set():
+                            break
+            self.busy = False
+
+    def latency_percentiles(self, percentiles=(50, 95, 99)):
+        return percentiles_ms(self.latencies, percentiles)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+class Pipeline:
+    """A chain of stages connected by drop-oldest queues."""
+
+    def __init__(self, lossless=False):
+        self.stages = []
+        self.lossless = lossless
+
+    def add_stage(self, name, func, inbox=None, outbox=None, **kwargs):
+        kwargs.setdefault("lossless", self.lossless)
+        stage = Stage(name, func, inbox=inbox, outbox=outbox, **kwargs)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+
+    def idle(self):
+        """True when no stage with an inbox has queued or in-progress work."""
+        return all(
+            not stage.busy and stage.inbox.qsize() == 0
+            for stage in self.stages if stage.inbox is not None
+        )
+
+    def stats(self):
+        """Per-stage counters; ``queue_depth``/``dropped`` describe the stage's inbox."""
+        stats = {}
+        for stage in self.stages:
+            entry = {"processed": stage.processed, "errors": stage.errors}
+            if stage.inbox is not None:
+                entry["queue_depth"] = stage.inbox.qsize()
+                entry["dropped"] = stage.inbox.dropped
+            stats[stage.name] = entry
+        return stats
@@ -0,0 +1,44 @@
+import numpy as np
+
+from tracker import Detections
+
+
+def class_names(names):
+    """Turn an Ultralytics ``names`` dict (id -> label) into a list indexed by class id."""
+    if isinstance(names, dict):
+        return [names[i] for i in range(len(names))]
+    return list(names)
+
+
+def to_detections(result):
+    """Move one Ultralytics result's boxes off the device in a single copy.
+
+    ``Boxes.data`` holds xyxy, confidence and class per row, so one
+    ``.cpu().numpy()`` replaces three separate transfers.
+    """
+    data = result.boxes.data.cpu().numpy()
+    return Detections(data[:, :4], data[:, 4], data[:, 5])
+
+
+def count_classes(class_ids, num_classes, confidences=None, conf_threshold=None):
+    """Per-class detection counts as a fixed-size int array of length ``num_classes``."""
+    class_ids = np.asarray(class_ids)
+    if conf_threshold is not None and confidences is not None:
+        class_ids = class_ids[np.asarray(confidences) >= conf_threshold]
+    return np.bincount(class_ids.astype(np.intp, copy=False), minlength=num_classes)
+
+
+def combine_counts(cam_counts, num_classes):
+    """Element-wise max over per-camera count arrays.
+
+    Each camera sees the same shelf from another angle, so an item is counted
+    by the camera that sees the most of it rather than summed across cameras.
+    """
+    if not len(cam_counts):
+        return np.zeros(num_classes, dtype=np.intp)
+    return np.max(cam_counts, axis=0)
+
+
+def counts_to_dict(counts, names):
+    """``{label: count}`` for the non-zero entries of ``counts``, in class id order."""
+    return {names[i]: int(counts[i]) for i in np.flatnonzero(counts)}
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+
+from pipeline import percentiles_ms
+
+
+class GetFPS:
+    """Frame rate of one stream, in the spirit of ``GETFPS`` from the DeepStream app.
+
+    Unlike ``GETFPS`` it is rolling: ``update_fps`` recomputes the rate once per
+    ``window`` seconds, so ``get_fps`` can be polled every frame (e.g. by the
+    overlay) without resetting the count.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._count = 0
+        self._start = time.monotonic()
+        self._fps = 0.0
+        self.frame_count = 0
+
+    def update_fps(self):
+        now = time.monotonic()
+        with self._lock:
+            self._count += 1
+            self.frame_count += 1
+            if now - self._start >= self.window:
+                self._fps = self._count / (now - self._start)
+                self._count = 0
+                self._start = now
+
+    def get_fps(self):
+        return round(self._fps, 2)
+
+
+class StageProfiler:
+    """Rolling per-section timings and per-stream FPS for the detection loop.
+
+    Sections are flat names such as ``"inference"`` or ``"capture.cam0"``; each
+    keeps its last ``history`` durations for p50/p95/p99. Streams work like
+    ``PERF_DATA``: one ``GetFPS`` per name, created on first update.
+    """
+
+    def __init__(self, history=1000, percentiles=(50, 95, 99)):
+        self.history = history
+        self.percentiles = percentiles
+        self.sections = {}
+        self.streams = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        durations = self.sections.get(name)
+        if durations is None:
+            with self._lock:
+                durations = self.sections.setdefault(name, deque(maxlen=self.history))
+        durations.append(seconds)
+
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def update_fps(self, stream):
+        fps = self.streams.get(stream)
+        if fps is None:
+            with self._lock:
+                fps = self.streams.setdefault(stream, GetFPS())
+        fps.update_fps()
+
+    def perf_dict(self):
+        with self._lock:
+            streams = dict(self.streams)
+        return {name: fps.get_fps() for name, fps in sorted(streams.items())}
+
+    def snapshot(self):
+        """``{"fps": {stream: fps}, "sections": {name: {"count", "p50_ms", ...}}}``."""
+        with self._lock:
+            sections = dict(self.sections)
+        return {
+            "fps": self.perf_dict(),
+            "sections": {
+                name: {"count": len(durations), **percentiles_ms(list(durations), self.percentiles)}
+                for name, durations in sorted(sections.items())
+            },
+        }
+
+    def draw_overlay(self, image, origin=(8, 8), font_scale=0.4):
+        """Draw FPS and section percentiles on a dark panel in the corner of ``image``."""
+        snapshot = self.snapshot()
+        lines = ["  ".join(f"{name} {fps:.1f}fps" for name, fps in snapshot["fps"].items() if "." not in name)]
+        for name, stats in snapshot["sections"].items():
+            if stats["count"]:
+                lines.append(f"{name:<16} p50 {stats['p50_ms']:6.1f}  p95 {stats['p95_ms']:6.1f} ms")
+        line_height = int(30 * font_scale) + 4
+        x, y = origin
+        width = min(image.shape[1] - x, 330)
+        height = min(image.shape[0] - y, line_height * len(lines) + 6)
+        cv2.rectangle(image, (x, y), (x + width, y + height), (0, 0, 0), -1)
+        for i, line in enumerate(lines):
+            cv2.putText(image, line, (x + 4, y + line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale, (0, 255, 255), 1)
+        return image
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+
+
+class RegionOfInterest:
+    """Part of a camera frame that is sent to the model.
+
+    Coordinates are fractions of the frame width and height, so the same ROI
+    holds at any capture resolution. A rectangle is ``(x, y, w, h)``; a polygon
+    is a list of ``(x, y)`` points, cropped to its bounding box with everything
+    outside it filled with the letterbox padding colour.
+    """
+
+    def __init__(self, rect=None, polygon=None):
+        if (rect is None) == (polygon is None):
+            raise ValueError("give either rect or polygon")
+        if polygon is not None:
+            polygon = np.asarray(polygon, dtype=np.float64)
+            if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+                raise ValueError("polygon needs at least three (x, y) points")
+            x, y = polygon.min(axis=0)
+            rect = (x, y, *(polygon.max(axis=0) - (x, y)))
+        x, y, w, h = rect
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > 1.0 + 1e-9 or y + h > 1.0 + 1e-9:
+            raise ValueError(f"ROI {rect} is not inside the unit square")
+        self.rect = (float(x), float(y), float(w), float(h))
+        self.polygon = polygon
+        self._mask_cache = {}
+
+    @classmethod
+    def parse(cls, text):
+        """``"x,y,w,h"`` for a rectangle or ``"x1,y1;x2,y2;x3,y3..."`` for a polygon."""
+        if ";" in text:
+            return cls(polygon=[[float(v) for v in point.split(",")] for point in text.split(";")])
+        values = [float(v) for v in text.split(",")]
+        if len(values) != 4:
+            raise ValueError(f"expected x,y,w,h, got {text!r}")
+        return cls(rect=values)
+
+    def bounds(self, frame_size):
+        """``(x, y, w, h)`` of the ROI in pixels of a ``frame_size`` (width, height) frame."""
+        frame_w, frame_h = frame_size
+        x, y, w, h = self.rect
+        x0, y0 = int(x * frame_w), int(y * frame_h)
+        x1, y1 = min(frame_w, round((x + w) * frame_w)), min(frame_h, round((y + h) * frame_h))
+        return x0, y0, max(1, x1 - x0), max(1, y1 - y0)
+
+    def outside_mask(self, frame_size, size):
+        """Boolean ``(h, w, 1)`` mask of pixels outside the polygon, for the ROI resized to ``size``.
+
+        ``None`` for rectangles. Masks are cached per size.
+        """
+        if self.polygon is None:
+            return None
+        key = (tuple(frame_size), tuple(size))
+        if key not in self._mask_cache:
+            x, y, w, h = self.bounds(frame_size)
+            points = (self.polygon * frame_size - (x, y)) * (size[0] / w, size[1] / h)
+            mask = np.zeros((size[1], size[0]), dtype=np.uint8)
+            cv2.fillPoly(mask, [np.round(points).astype(np.int32)], 1)
+            self._mask_cache[key] = (mask == 0)[..., None]
+        return self._mask_cache[key]
+
+    def crop(self, image, pad_value=114):
+        """The ROI of a BGR ``image``: a view for rectangles, a masked copy for polygons."""
+        frame_size = (image.shape[1], image.shape[0])
+        x, y, w, h = self.bounds(frame_size)
+        region = image[y:y + h, x:x + w]
+        outside = self.outside_mask(frame_size, (w, h))
+        if outside is not None:
+            region = region.copy()
+            np.copyto(region, np.uint8(pad_value), where=outside)
+        return region
@@ -0,0 +1,86 @@
+import json
+import os
+import queue
+import sys
+import threading
+
+import cv2
+
+from pipeline import DropOldestQueue
+
+ENCODE_PARAMS = {
+    "jpg": lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    "png": lambda quality: [cv2.IMWRITE_PNG_COMPRESSION, min(9, max(0, (100 - quality) // 10))],
+    "webp": lambda quality: [cv2.IMWRITE_WEBP_QUALITY, quality],
+}
+
+
+class SnapshotWriter:
+    """Encodes and writes snapshots on background threads.
+
+    ``submit`` only enqueues, so callers never wait on encoding or disk I/O.
+    The queue is bounded; during a burst the oldest pending snapshot is
+    dropped rather than stalling the caller.
+    """
+
+    def __init__(self, output_dir, image_format="jpg", quality=90, workers=2, max_pending=16):
+        if image_format not in ENCODE_PARAMS:
+            raise ValueError(f"Unsupported snapshot format: {image_format}")
+        self.output_dir = output_dir
+        self.image_format = image_format
+        self.encode_params = ENCODE_PARAMS[image_format](quality)
+        self.queue = DropOldestQueue(maxsize=max_pending)
+        self.written = 0
+        self.errors = 0
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"snapshot-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name, image, annotate=None, sidecar=None):
+        """Queue ``image`` for writing as ``<name>.<format>``.
+
+        ``image`` must not be modified afterwards. ``annotate``, if given, is
+        called on a copy in the worker to produce ``<name>_annotated``;
+        ``sidecar`` is a JSON-serialisable dict written to ``<name>.json``.
+        """
+        self.queue.put((name, image, annotate, sidecar))
+
+    def _worker(self):
+        while self._running or self.queue.qsize():
+            try:
+                job = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self._write(*job)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Snapshot '{job[0]}' failed: {e}", file=sys.stderr)
+
+    def _write(self, name, image, annotate, sidecar):
+        base = os.path.join(self.output_dir, name)
+        cv2.imwrite(f"{base}.{self.image_format}", image, self.encode_params)
+        if annotate is not None:
+            cv2.imwrite(f"{base}_annotated.{self.image_format}", annotate(image.copy()), self.encode_params)
+        if sidecar is not None:
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(sidecar, f, indent=2)
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "errors": self.errors,
+            "queue_depth": self.queue.qsize(),
+            "dropped": self.queue.dropped,
+        }
+
+    def close(self, timeout=5.0):
+        """Finish pending snapshots, then stop the workers."""
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout)
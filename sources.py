@@ -0,0 +1,217 @@
+import glob
+import os
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "ffmpeg": cv2.CAP_FFMPEG,
+}
+
+
+class FrameSource:
+    """Replayable camera stand-in with the subset of the ``cv2.VideoCapture`` API
+    that ``MultiCameraYOLO`` uses (``isOpened``, ``set``, ``read``, ``release``).
+
+    With ``realtime`` the source is paced at ``fps``; otherwise it delivers
+    frames as fast as they are read. Once the frames run out ``read`` returns
+    ``(False, None)`` and ``exhausted`` is set, unless ``loop`` rewinds it.
+    ``grab``/``retrieve`` split a read in two like their OpenCV counterparts.
+    """
+
+    def __init__(self, fps=30.0, realtime=True, loop=False):
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.exhausted = False
+        self._next_time = None
+        self._grabbed = None
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+    def _next_frame(self, image):
+        raise NotImplementedError
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def _pace(self):
+        if not self.realtime:
+            return
+        now = time.monotonic()
+        if self._next_time is not None and self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time = max(now, self._next_time or now) + 1.0 / self.fps
+
+    def read(self, image=None):
+        if self.exhausted:
+            return False, None
+        self._pace()
+        frame = self._next_frame(image)
+        if frame is None and self.loop:
+            self._rewind()
+            frame = self._next_frame(image)
+        if frame is None:
+            self.exhausted = True
+            return False, None
+        return True, frame
+
+    def grab(self):
+        ret, self._grabbed = self.read()
+        return ret
+
+    def retrieve(self, image=None):
+        frame, self._grabbed = self._grabbed, None
+        if frame is None:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            image[:] = frame
+            return True, image
+        return True, frame
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, realtime=True, loop=False):
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(self.cap.get(cv2.CAP_PROP_FPS) or 30.0, realtime, loop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+    def _next_frame(self, image):
+        ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+        return frame if ret else None
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+
+class ImageFolderSource(FrameSource):
+    def __init__(self, path, fps=30.0, realtime=True, loop=False):
+        super().__init__(fps, realtime, loop)
+        self.files = sorted(
+            f for f in glob.glob(os.path.join(path, "*")) if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._index = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def _next_frame(self, image):
+        if self._index >= len(self.files):
+            return None
+        frame = cv2.imread(self.files[self._index])
+        self._index += 1
+        if image is not None and frame is not None and image.shape == frame.shape:
+            image[:] = frame
+            return image
+        return frame
+
+    def _rewind(self):
+        self._index = 0
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generated scene: a few coloured boxes drifting over a gradient."""
+
+    def __init__(self, width=1280, height=720, fps=30.0, num_frames=300, seed=0, realtime=True, loop=False):
+        super().__init__(fps, realtime, loop)
+        self.num_frames = num_frames
+        self._index = 0
+        rng = np.random.default_rng(seed)
+        gradient = np.linspace(40, 200, width, dtype=np.uint8)
+        self._background = np.repeat(np.tile(gradient, (height, 1))[:, :, None], 3, axis=2)
+        self._boxes = [
+            (rng.integers(0, width - 120), rng.integers(0, height - 200), rng.integers(-4, 5),
+             tuple(int(c) for c in rng.integers(0, 256, 3)))
+            for _ in range(5)
+        ]
+
+    def _next_frame(self, image):
+        if self.num_frames is not None and self._index >= self.num_frames:
+            return None
+        if image is None or image.shape != self._background.shape:
+            image = np.empty_like(self._background)
+        np.copyto(image, self._background)
+        width = image.shape[1]
+        for x, y, dx, color in self._boxes:
+            x = int((x + dx * self._index) % (width - 120))
+            cv2.rectangle(image, (x, int(y)), (x + 120, int(y) + 200), color, -1)
+        self._index += 1
+        return image
+
+    def _rewind(self):
+        self._index = 0
+
+
+def configure_capture(cap, width=None, height=None, fourcc=None, fps=None, buffer_size=None):
+    """Apply capture settings to a live ``cv2.VideoCapture`` and return what the driver accepted.
+
+    The pixel format goes first because many drivers only offer high
+    resolutions and frame rates in compressed formats such as ``"MJPG"``.
+    """
+    if fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if width:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    if height:
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    if buffer_size is not None:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fourcc": "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)) if code else None,
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+
+def open_source(spec, realtime=True, loop=False, seed=0, backend="any"):
+    """Open a camera source from a spec.
+
+    ``0`` / ``"0"`` or a URL opens a live ``cv2.VideoCapture`` through
+    ``backend`` (a key of ``BACKENDS``); a directory is an image folder;
+    ``"synthetic[:WxH[@FPS[:FRAMES]]]"`` is a generated scene; anything else
+    is treated as a video file.
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        return cv2.VideoCapture(int(spec), BACKENDS[backend])
+    spec = str(spec)
+    if "://" in spec:
+        return cv2.VideoCapture(spec, BACKENDS[backend])
+    if spec.startswith("synthetic"):
+        width, height, fps, num_frames = 1280, 720, 30.0, 300
+        params = spec.split(":")[1:]
+        if params:
+            size, _, rate = params[0].partition("@")
+            width, height = (int(v) for v in size.split("x"))
+            fps = float(rate) if rate else fps
+        if len(params) > 1:
+            num_frames = int(params[1])
+        return SyntheticSource(width, height, fps, num_frames, seed=zlib.crc32(spec.encode()) + seed, realtime=realtime, loop=loop)
+    if os.path.isdir(spec):
+        return ImageFolderSource(spec, realtime=realtime, loop=loop)
+    return VideoFileSource(spec, realtime=realtime, loop=loop)
@@ -0,0 +1,107 @@
+"""The change gate under load: realtime cameras feeding a detector slower than capture."""
+import json
+import sys
+import time
+import types
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import main
+from sources import FrameSource
+
+INFER_SECONDS = 0.3
+SIZE = (320, 180)
+# Items are white squares at these (x, y) fractions of the frame; the fake model finds them there.
+ITEM_SPOTS = [(0.1, 0.2), (0.5, 0.2)]
+ITEM_SIZE = (0.2, 0.3)
+
+
+class SceneSource(FrameSource):
+    """Realtime source that draws ``items(index)`` white squares, over a background that
+    changes every frame when ``moving``. Remembers when the item count first changed."""
+
+    def __init__(self, items, moving=False, fps=30.0):
+        super().__init__(fps, realtime=True)
+        self.items = items
+        self.moving = moving
+        self.index = 0
+        self.changed_at = None
+
+    def _next_frame(self, image):
+        width, height = SIZE
+        level = (self.index * 47) % 200 if self.moving else 60
+        image = np.full((height, width, 3), level, dtype=np.uint8)
+        count = self.items(self.index)
+        for x, y in ITEM_SPOTS[:count]:
+            x1, y1 = int(x * width), int(y * height)
+            image[y1:y1 + int(ITEM_SIZE[1] * height), x1:x1 + int(ITEM_SIZE[0] * width)] = 255
+        if self.changed_at is None and self.index and count != self.items(self.index - 1):
+            self.changed_at = datetime.now()
+        self.index += 1
+        return image
+
+
+class FakeBoxes:
+    def __init__(self, rows):
+        self.data = types.SimpleNamespace(cpu=lambda: types.SimpleNamespace(numpy=lambda: rows))
+
+
+class FakeYOLO:
+    """Busy detector: takes INFER_SECONDS per batch and reports the white squares it sees."""
+
+    names = {0: "bottle"}
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def to(self, device):
+        return self
+
+    def __call__(self, images, **kwargs):
+        time.sleep(INFER_SECONDS)
+        results = []
+        for image in images:
+            height, width = image.shape[:2]
+            rows = []
+            for x, y in ITEM_SPOTS:
+                x1, y1 = x * width, y * height
+                x2, y2 = x1 + ITEM_SIZE[0] * width, y1 + ITEM_SIZE[1] * height
+                if image[int((y1 + y2) / 2), int((x1 + x2) / 2)].min() == 255:
+                    rows.append([x1, y1, x2, y2, 0.9, 0])
+            results.append(types.SimpleNamespace(boxes=FakeBoxes(np.array(rows, np.float32).reshape(-1, 6))))
+        return results
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=types.SimpleNamespace(is_available=lambda: False)))
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=FakeYOLO))
+
+
+@pytest.mark.parametrize("infer_interval", [1, 3])
+def test_persistent_change_reaches_counts_under_busy_inference(fake_model, monkeypatch, tmp_path, infer_interval):
+    # Camera 0 changes every frame and keeps the detector busy; camera 1 goes from one
+    # item to two after 1.5 s and stays that way.
+    sources = {
+        "moving": SceneSource(lambda i: 0, moving=True),
+        "items": SceneSource(lambda i: 1 if i < 45 else 2),
+    }
+    monkeypatch.setattr(main, "open_source", lambda spec, **kwargs: sources[spec])
+    output = tmp_path / "results.jsonl"
+    model = main.MultiCameraYOLO(camera_ids=[0, 1], sources=["moving", "items"], capture_mode="full",
+                                 infer_interval=infer_interval, headless=True, result_output=str(output), warmup=False)
+    model.run(duration=4.0)
+
+    changed_at = sources["items"].changed_at
+    assert changed_at is not None
+    updates = [
+        datetime.fromisoformat(record["timestamp"])
+        for record in map(json.loads, output.read_text().splitlines())
+        if record["cameras"].get("1", {}).get("bottle") == 2
+    ]
+    assert updates, "camera 1 never reported the second item"
+    # Each inference takes one batch: the one in flight when the scene changed, then up
+    # to infer_interval more until the detector is due, with a batch of slack.
+    assert (updates[0] - changed_at).total_seconds() < (infer_interval + 3) * INFER_SECONDS
@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import numpy as np
+
+Detections = namedtuple("Detections", ["boxes", "confidences", "class_ids"])
+
+
+def box_iou(a, b):
+    """Pairwise IoU between two ``(N, 4)`` and ``(M, 4)`` xyxy arrays."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class IoUTracker:
+    """Greedy IoU tracker that smooths per-frame detections into stable objects.
+
+    A track is started by a detection above ``high_conf`` and is kept alive by
+    any overlapping detection above ``low_conf``. That hysteresis stops counts
+    from flickering when a box hovers around a single confidence cut. Tracks
+    that go unmatched for more than ``max_misses`` detector runs are dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, high_conf=0.7, low_conf=0.4, max_misses=2):
+        self.iou_threshold = iou_threshold
+        self.high_conf = high_conf
+        self.low_conf = low_conf
+        self.max_misses = max_misses
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.confidences = np.empty(0, dtype=np.float32)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.misses = np.empty(0, dtype=np.int64)
+
+    def update(self, boxes, confidences, class_ids):
+        keep = confidences >= self.low_conf
+        boxes, confidences, class_ids = boxes[keep], confidences[keep], class_ids[keep].astype(np.int64)
+
+        matched_tracks = np.zeros(len(self.boxes), dtype=bool)
+        matched_dets = np.zeros(len(boxes), dtype=bool)
+        if len(self.boxes) and len(boxes):
+            iou = box_iou(self.boxes, boxes)
+            # Greedy assignment, best overlaps first.
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if matched_tracks[t] or matched_dets[d]:
+                    continue
+                matched_tracks[t] = matched_dets[d] = True
+                self.boxes[t] = boxes[d]
+                self.confidences[t] = confidences[d]
+                self.class_ids[t] = class_ids[d]
+                self.misses[t] = 0
+
+        self.misses[~matched_tracks] += 1
+        alive = self.misses <= self.max_misses
+        new = ~matched_dets & (confidences >= self.high_conf)
+        self.boxes = np.concatenate([self.boxes[alive], boxes[new]])
+        self.confidences = np.concatenate([self.confidences[alive], confidences[new]])
+        self.class_ids = np.concatenate([self.class_ids[alive], class_ids[new]])
+        self.misses = np.concatenate([self.misses[alive], np.zeros(int(new.sum()), dtype=np.int64)])
+        return self.detections()
+
+    def detections(self):
+        return Detections(self.boxes.copy(), self.confidences.copy(), self.class_ids.copy())